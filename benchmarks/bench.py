@@ -0,0 +1,331 @@
+'''
+Nesse módulo consta o conjunto de benchmarks dos trechos mais custosos da
+relaxação lagrangiana: heurística lagrangiana, busca local, identificação de
+subciclos, 1-árvore mínima e iterações do método do subgradiente. As
+instâncias são Euclidianas, sintéticas e geradas a partir de uma semente, e
+os resultados são salvos em JSON para que possam ser comparados entre commits.
+Opcionalmente, compara a quebra de simetria do modelo exato com o parâmetro
+'Symmetry' do Gurobi.
+
+Os tamanhos das instâncias resolvidas pelo Gurobi dependem da licença do
+ambiente (licenças restritas limitam o nº de variáveis), logo os seus padrões
+podem ser definidos pelas variáveis de ambiente 'BENCH_GUROBI_SIZES' e
+'BENCH_SYMMETRY_SIZES' (por exemplo, "20 30 40").
+
+Uso: `python benchmarks/bench.py [--sizes 50 100 ...] [--gurobi]
+[--symmetry] [--output bench.json] [--compare anterior.json]`
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from distance import DistanceMatrix
+from lagrangian_heuristic import lagrangian_heuristic, tours_cost
+from local_search import local_search, neighbor_lists
+from one_tree import min_one_tree, penalized_matrix
+from separation import solution_cycles, tour_cycles
+from utils import edge_arrays
+
+def make_instance(n, seed):
+    '''
+    Gera uma instância Euclidiana com n pontos uniformes no quadrado [0,1]².
+    '''
+
+    rng = np.random.default_rng(seed)
+    return DistanceMatrix.from_points(rng.uniform(0, 1, size=(n, 2)))
+
+def overlapping_tours(n, seed, perturbations=None):
+    '''
+    Gera dois tours com muitas arestas em comum, como os retornados pela
+    relaxação: o segundo é o primeiro com algumas inversões de segmentos.
+    '''
+
+    r = random.Random(seed)
+    tour = list(range(n))
+    r.shuffle(tour)
+
+    other = tour.copy()
+    for _ in range(perturbations or max(1, n // 10)):
+        i, j = sorted(r.sample(range(n), 2))
+        other[i:j + 1] = reversed(other[i:j + 1])
+
+    return [tour, other]
+
+def random_cycles(n, seed, size=10):
+    '''
+    Gera arestas de um grafo 2-regular formado por subciclos de tamanho
+    aproximado 'size', como em uma solução que viola as restrições de
+    eliminação de subciclo.
+    '''
+
+    r = random.Random(seed)
+    vertices = list(range(n))
+    r.shuffle(vertices)
+
+    ei, ej = [], []
+    start = 0
+    while start < n:
+        end = min(n, start + max(3, size))
+        if n - end < 3:
+            end = n
+        cycle = vertices[start:end]
+        for a, b in zip(cycle, cycle[1:] + cycle[:1]):
+            ei.append(max(a, b))
+            ej.append(min(a, b))
+        start = end
+
+    return np.array(ei), np.array(ej)
+
+def measure(fn, repeats):
+    '''
+    Executa 'fn' 'repeats' vezes e retorna os tempos de cada execução.
+    '''
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+def bench_components(n, seed, repeats):
+    '''
+    Mede os componentes que não dependem do Gurobi para uma instância.
+
+    Returns:
+        Lista de registros, um por componente.
+    '''
+
+    dist = make_instance(n, seed)
+    tours = overlapping_tours(n, seed)
+    neighbors = neighbor_lists(dist, 10)
+    _, repaired = lagrangian_heuristic(dist, tours, n, neighbors=neighbors)
+    ei, ej = random_cycles(n, seed)
+
+    # Solução (K = 2) com subciclos, no formato do vetor de variáveis 'x'
+    all_ei, all_ej = edge_arrays(n)
+    x_sol = np.zeros((2, len(all_ei)))
+    x_sol[:, ei * (ei - 1) // 2 + ej] = 1.0
+    C = penalized_matrix(n, (all_ei, all_ej), dist.vector)
+
+    components = {
+        'tours_cost': lambda: tours_cost(dist, tours),
+        # As listas de vizinhos são calculadas uma única vez no método do
+        # subgradiente e medidas à parte, em 'neighbor_lists'
+        'lagrangian_heuristic': lambda: lagrangian_heuristic(
+            dist, tours, n, neighbors=neighbors
+        ),
+        'neighbor_lists': lambda: neighbor_lists(dist, 10),
+        'local_search': lambda: local_search(dist, repaired, neighbors),
+        'tour_cycles': lambda: tour_cycles(n, ei, ej),
+        'solution_cycles': lambda: solution_cycles(
+            2, n, x_sol, (all_ei, all_ej)
+        ),
+        'min_one_tree': lambda: min_one_tree(C),
+    }
+
+    records = []
+    for name, fn in components.items():
+        times = measure(fn, repeats)
+        records.append({
+            'component': name, 'n': n, 'repeats': repeats,
+            'best_s': min(times), 'mean_s': float(np.mean(times)),
+            'throughput_per_s': 1.0 / min(times) if min(times) > 0 else None,
+        })
+
+    return records
+
+def bench_subgradient(n, seed, iterations, decomposed):
+    '''
+    Mede as iterações do método do subgradiente (requer o Gurobi).
+
+    Returns:
+        Registro com o tempo médio por iteração.
+    '''
+
+    from runner import make_env
+    from solve import k_tsp
+
+    dist = make_instance(n, seed)
+    name = 'subgradient_decomposed' if decomposed else 'subgradient'
+    env = make_env()
+
+    start = time.perf_counter()
+    sol = k_tsp(
+        2, n, dist, relaxed=True, decomposed=decomposed, env=env,
+        max_iterations=iterations
+    )
+    elapsed = time.perf_counter() - start
+
+    return {
+        'component': name, 'n': n, 'repeats': sol['iterations'],
+        'best_s': elapsed / sol['iterations'],
+        'mean_s': elapsed / sol['iterations'],
+        'throughput_per_s': sol['iterations'] / elapsed,
+    }
+
+# Variantes do modelo exato comparadas em 'bench_symmetry': argumentos de
+# 'k_tsp' de cada uma
+SYMMETRY_VARIANTS = {
+    'gurobi_default': {},
+    'gurobi_off': {'symmetry': 0},
+    'gurobi_aggressive': {'symmetry': 2},
+    'breaking': {'symmetry_breaking': True},
+    'breaking_gurobi_off': {'symmetry_breaking': True, 'symmetry': 0},
+}
+
+def bench_symmetry(n, seed, K):
+    '''
+    Resolve o modelo exato do K-TSP com cada variante de tratamento de
+    simetria (requer o Gurobi). A solução construída não é usada, para que
+    a busca dependa apenas do modelo.
+
+    Returns:
+        Lista de registros, um por variante, com tempo e nº de nós.
+    '''
+
+    from runner import make_env
+    from solve import k_tsp
+
+    dist = make_instance(n, seed)
+    env = make_env()
+
+    records = []
+    for name, options in SYMMETRY_VARIANTS.items():
+        sol = k_tsp(K, n, dist, env=env, warm_start=False, **options)
+        records.append({
+            'component': f'exact_K{K}_{name}', 'n': n, 'repeats': 1,
+            'best_s': sol['runtime'], 'mean_s': sol['runtime'],
+            'throughput_per_s': None, 'node_count': sol['node_count'],
+            'cost': sol['opt']['cost'],
+        })
+
+    return records
+
+def env_sizes(name, default):
+    '''
+    Tamanhos de instância da variável de ambiente 'name' (inteiros separados
+    por espaços ou vírgulas), ou 'default' se ela não estiver definida.
+    '''
+
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return [int(size) for size in value.replace(',', ' ').split()]
+
+def scaling(records):
+    '''
+    Estima, para cada componente, o expoente b em tempo ~ n^b por regressão
+    linear em escala log-log.
+    '''
+
+    curves = {}
+    for name in sorted({r['component'] for r in records}):
+        points = [
+            (r['n'], r['best_s']) for r in records
+            if r['component'] == name and r['best_s'] > 0
+        ]
+        if len(points) >= 2:
+            n, t = np.log(np.array(points)).T
+            curves[name] = float(np.polyfit(n, t, 1)[0])
+
+    return curves
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, previous):
+    '''
+    Imprime a razão entre os tempos atuais e os de um resultado anterior.
+    '''
+
+    old = {(r['component'], r['n']): r['best_s'] for r in previous['results']}
+    print(f"\nComparação com {previous.get('commit')}:")
+    for r in current['results']:
+        key = (r['component'], r['n'])
+        if key in old and old[key] > 0:
+            print(f"{r['component']:>26} n={r['n']:<5} "
+                  f"{r['best_s'] / old[key]:6.2f}x")
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[50, 100, 200, 500, 1000, 2000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--gurobi', default=False, action='store_true')
+    parser.add_argument(
+        '--gurobi-sizes', type=int, nargs='+',
+        default=env_sizes('BENCH_GUROBI_SIZES', [50, 100, 200])
+    )
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--symmetry', default=False, action='store_true')
+    parser.add_argument(
+        '--symmetry-sizes', type=int, nargs='+',
+        default=env_sizes('BENCH_SYMMETRY_SIZES', [30, 40])
+    )
+    parser.add_argument('--symmetry-K', type=int, nargs='+', default=[2, 3])
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    records = []
+    for n in args.sizes:
+        for record in bench_components(n, args.seed, args.repeats):
+            records.append(record)
+            print(f"{record['component']:>26} n={n:<5} "
+                  f"{record['best_s'] * 1e3:10.3f} ms")
+
+    if args.gurobi:
+        for n in args.gurobi_sizes:
+            for decomposed in (False, True):
+                record = bench_subgradient(
+                    n, args.seed, args.iterations, decomposed
+                )
+                records.append(record)
+                print(f"{record['component']:>26} n={n:<5} "
+                      f"{record['best_s'] * 1e3:10.3f} ms/iteração")
+
+    if args.symmetry:
+        for n in args.symmetry_sizes:
+            for K in args.symmetry_K:
+                for record in bench_symmetry(n, args.seed, K):
+                    records.append(record)
+                    print(f"{record['component']:>26} n={n:<5} "
+                          f"{record['best_s'] * 1e3:10.3f} ms "
+                          f"{record['node_count']:8.0f} nós")
+
+    result = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'seed': args.seed,
+        'results': records,
+        'scaling': scaling(records),
+    }
+
+    print('\nExpoente de escala (tempo ~ n^b):')
+    for name, b in result['scaling'].items():
+        print(f'{name:>26} b={b:.2f}')
+
+    with open(args.output, 'w') as fp:
+        json.dump(result, fp, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as fp:
+            compare(result, json.load(fp))
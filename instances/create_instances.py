@@ -1,32 +1,42 @@
 '''
-Nesse módulo são geradas 5 instâncias para o problema 2-TSP. Renomeamos as 
-instâncias que geramos e testamos (`fixed_instances.pkl`) para evitar que a 
-execução desse código as sobreponha.
-'''
-
-import math
-import pickle
-import random
-
-instances = []
-
-# Variar quantidade de vértices
-num_vertices_list = [100, 150, 200, 250, 300]
+Nesse módulo são geradas instâncias para o problema 2-TSP. Por padrão, são
+geradas 5 instâncias uniformes, com 100 a 300 vértices. Renomeamos as
+instâncias que geramos e testamos (`fixed_instances.npy` e
+`fixed_instances.json`) para evitar que a execução desse código as sobreponha.
 
-# Gerar uma instância para cada quantidade
-for n in num_vertices_list:
-
-  # Gerar n pontos aleatórios no intervalo [0,1]
-  points = [(random.uniform(0, 1), random.uniform(0, 1)) for i in range(n)]
-
-  # Dicionário de distâncias Euclidianas entre cada par de pontos
-  dist = {
-    (i, j): math.sqrt(sum((points[i][k]-points[j][k])**2 for k in range(2)))
-            for i in range(n) for j in range(i)
-  }
-
-  instances.append({'n': n, 'dist': dist})
+Uso: `python instances/create_instances.py [--kind uniform|clustered|grid]
+[--sizes 100 150 ...] [--seed S] [--tsplib arquivo.tsp ...] [--output prefixo]`
+'''
 
-# Salvar instâncias em 'instances.pkl' 
-with open('instances.pkl', 'wb') as output:
-    pickle.dump(instances, output)
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from generators import GENERATORS, generate_instance
+from instance_io import save_instances
+from tsplib import read_tsplib
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--kind', default='uniform', choices=GENERATORS)
+parser.add_argument('--sizes', type=int, nargs='*',
+                    default=[100, 150, 200, 250, 300])
+parser.add_argument('--seed', type=int, default=None)
+parser.add_argument('--tsplib', nargs='*', default=[])
+parser.add_argument('--output', default='instances')
+args = parser.parse_args()
+
+# Gerar uma instância para cada quantidade de vértices, cada uma com a sua
+# semente (derivada de '--seed') para que sejam reproduzíveis
+instances = [
+    generate_instance(
+        args.kind, n, None if args.seed is None else args.seed + idx
+    )
+    for idx, n in enumerate(args.sizes)
+]
+
+# Incluir instâncias do TSPLIB
+instances += [read_tsplib(path) for path in args.tsplib]
+
+# Salvar instâncias em '<output>.npy' e '<output>.json'
+save_instances(args.output, instances)
@@ -0,0 +1,72 @@
+'''
+Nesse módulo constam o salvamento atômico e a recuperação do estado do método
+do subgradiente, bem como a escrita dos resultados em formato JSONL (um objeto
+JSON por linha).
+'''
+import os
+import json
+import pickle
+import numpy as np
+
+def save_checkpoint(path, state):
+    '''
+    Salva o estado de forma atômica: o arquivo é escrito em um temporário no
+    mesmo diretório e então renomeado, de modo que uma interrupção nunca deixa
+    um checkpoint corrompido.
+
+    Args:
+        path: caminho do checkpoint.
+        state: dicionário com o estado a ser salvo.
+    '''
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as fp:
+        pickle.dump(state, fp)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    '''
+    Recupera o estado salvo em um checkpoint.
+
+    Args:
+        path: caminho do checkpoint.
+
+    Returns:
+        Dicionário com o estado salvo ou 'None', se não houver checkpoint.
+    '''
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as fp:
+        return pickle.load(fp)
+
+def _to_json(value):
+    # Tipos do NumPy não são serializáveis diretamente
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f'{type(value)} não é serializável')
+
+class JsonlWriter:
+    '''
+    Escreve registros em um arquivo JSONL, um por linha, à medida que são
+    produzidos. O arquivo é aberto em modo de acréscimo, o que permite
+    continuar o mesmo arquivo após retomar uma execução.
+
+    Args:
+        path: caminho do arquivo.
+    '''
+
+    def __init__(self, path):
+        self.fp = open(path, 'a')
+
+    def write(self, record):
+        self.fp.write(json.dumps(record, default=_to_json) + '\n')
+        self.fp.flush()
+
+    def close(self):
+        self.fp.close()
@@ -0,0 +1,224 @@
+'''
+Nesse módulo consta a construção de K tours disjuntos nas arestas, usada como
+limitante superior inicial do método do subgradiente e como solução inicial
+(MIP start) do modelo exato do K-TSP.
+'''
+import math
+import numpy as np
+from local_search import local_search, neighbor_lists
+
+def edge_ids(i, j):
+    '''
+    Identificadores fixos das arestas (i[e], j[e]), em qualquer ordem.
+    '''
+
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+    hi, lo = np.maximum(i, j), np.minimum(i, j)
+    return hi * (hi - 1) // 2 + lo
+
+def tour_edge_ids(tour):
+    '''
+    Identificadores fixos das arestas de um tour.
+    '''
+
+    return edge_ids(tour, tour[1:] + tour[:1])
+
+def feasible_tours(tours, n, K=None):
+    '''
+    Verifica se os tours formam uma solução viável do K-TSP: K ciclos
+    hamiltonianos (permutações dos n vértices) disjuntos nas arestas.
+
+    Args:
+        tours: Lista de tours.
+        n: nº de vértices.
+        K: nº de caixeiros viajantes. Se 'None', não é verificado.
+
+    Returns:
+        Booleano que indica se os tours são viáveis.
+    '''
+
+    if not tours or (K is not None and len(tours) != K):
+        return False
+    for tour in tours:
+        if len(tour) != n or sorted(tour) != list(range(n)):
+            return False
+
+    ids = np.concatenate([tour_edge_ids(list(tour)) for tour in tours])
+    return len(np.unique(ids)) == len(ids)
+
+def complete_tour(dist, neighbors, adjacency, forbidden, rng=None):
+    '''
+    Completa um conjunto de caminhos disjuntos (fragmentos) em um tour, sem
+    usar arestas proibidas. Como na construção gulosa por arestas do TSP, cada
+    vértice guarda a outra extremidade do seu fragmento, o que permite unir
+    fragmentos em O(1) sem formar ciclos:
+
+    1. une fragmentos pelas arestas candidatas (listas de vizinhos) de menor
+       custo;
+    2. une os fragmentos restantes pela aresta permitida mais barata entre
+       extremidades;
+    3. concatena o que restar e fecha o tour;
+    4. remove eventuais arestas proibidas do passo 3 com trocas 2-opt.
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        neighbors: Lista de vizinhos mais próximos de cada vértice.
+        adjacency: Lista com os vizinhos de cada vértice nos fragmentos (grau
+            no máximo 2, sem ciclos). É modificada pela função.
+        forbidden: vetor ordenado com os identificadores das arestas proibidas.
+        rng: 'random.Random' usado para desempatar arestas candidatas de
+            mesmo custo de forma aleatória. Se 'None', o desempate é
+            determinístico.
+
+    Returns:
+        Lista de vértices do tour.
+    '''
+
+    n = dist.n
+    forbidden_set = set(forbidden.tolist())
+
+    def allowed(i, j):
+        hi, lo = (i, j) if i > j else (j, i)
+        return hi * (hi - 1) // 2 + lo not in forbidden_set
+
+    # Outra extremidade do fragmento de cada vértice de grau menor que 2
+    other_end = list(range(n))
+    for v in range(n):
+        if len(adjacency[v]) == 1 and other_end[v] == v:
+            prev, current = v, adjacency[v][0]
+            while len(adjacency[current]) == 2:
+                a, b = adjacency[current]
+                prev, current = current, (b if a == prev else a)
+            other_end[v], other_end[current] = current, v
+
+    fragments = sum(len(adj) < 2 for adj in adjacency)
+    fragments -= sum(len(adj) == 1 for adj in adjacency) // 2
+
+    def link(v, w):
+        a, b = other_end[v], other_end[w]
+        other_end[a], other_end[b] = b, a
+        adjacency[v].append(w)
+        adjacency[w].append(v)
+
+    # 1. Arestas candidatas, em ordem crescente de custo
+    candidates = sorted(
+        (dist[v, w], rng.random() if rng is not None else 0, v, w)
+        for v in range(n) if len(adjacency[v]) < 2
+        for w in neighbors[v] if v < w and len(adjacency[w]) < 2
+    )
+    for _, _, v, w in candidates:
+        if fragments == 1:
+            break
+        if len(adjacency[v]) < 2 and len(adjacency[w]) < 2 and\
+                other_end[v] != w and allowed(v, w):
+            link(v, w)
+            fragments -= 1
+
+    # 2. Aresta permitida mais barata entre extremidades de fragmentos
+    # distintos, a partir de cada extremidade
+    while fragments > 1:
+        ends = np.array([v for v in range(n) if len(adjacency[v]) < 2])
+        linked = False
+        for v in ends.tolist():
+            if len(adjacency[v]) == 2:
+                continue
+            others = ends[
+                (ends != v) & (ends != other_end[v]) &
+                np.array([len(adjacency[w]) < 2 for w in ends.tolist()])
+            ]
+            ok = ~np.isin(edge_ids(v, others), forbidden)
+            if ok.any():
+                costs = dist.batch(np.full(ok.sum(), v), others[ok])
+                link(v, int(others[ok][np.argmin(costs)]))
+                fragments -= 1
+                linked = True
+                break
+        if not linked:
+            break
+
+    # 3. Concatenar os fragmentos restantes e fechar o tour
+    tour = []
+    visited = [False] * n
+    for start in range(n):
+        if visited[start] or len(adjacency[start]) == 2:
+            continue
+        prev, current = None, start
+        while True:
+            tour.append(current)
+            visited[current] = True
+            nxt = [w for w in adjacency[current] if w != prev]
+            if not nxt:
+                break
+            prev, current = current, nxt[0]
+    if len(tour) < n:
+        # Fragmento único já fechado em ciclo: percorrer a partir do vértice 0
+        tour, prev, current = [0], 0, adjacency[0][0]
+        while current != 0:
+            tour.append(current)
+            a, b = adjacency[current]
+            prev, current = current, (b if a == prev else a)
+
+    # 4. Trocar cada aresta proibida (a, b) e uma aresta (c, d) por (a, c) e
+    # (b, d), permitidas, com o menor aumento de custo
+    tour = np.array(tour)
+    for _ in range(n):
+        succ = np.roll(tour, -1)
+        bad = np.flatnonzero(np.isin(edge_ids(tour, succ), forbidden))
+        if len(bad) == 0:
+            break
+
+        p = bad[0]
+        a, b = tour[p], succ[p]
+        ok = (tour != a) & (tour != b) & (succ != a) & (succ != b) &\
+            ~np.isin(edge_ids(a, tour), forbidden) &\
+            ~np.isin(edge_ids(b, succ), forbidden)
+        if not ok.any():
+            break
+
+        delta = dist.batch(np.full(n, a), tour) + dist.batch(np.full(n, b), succ)
+        delta -= dist.batch(tour, succ)
+        q = int(np.flatnonzero(ok)[np.argmin(delta[ok])])
+
+        # Inverter o caminho entre b e c
+        lo, hi = sorted((p, q))
+        tour[lo + 1:hi + 1] = tour[lo + 1:hi + 1][::-1]
+
+    return tour.tolist()
+
+def construct_tours(dist, K, neighbors=None):
+    '''
+    Constrói K tours disjuntos nas arestas: cada tour é construído de forma
+    gulosa por arestas, proibindo as arestas dos tours anteriores, e o
+    conjunto é então melhorado pela busca local.
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        K: nº de caixeiros viajantes.
+        neighbors: Lista de vizinhos mais próximos de cada vértice. Se 'None',
+            são usados os 10 mais próximos.
+
+    Returns:
+        Tupla com custo dos tours e lista dos tours. Se a construção não
+        conseguir eliminar todas as arestas repetidas (o que pode ocorrer
+        com K próximo de (n-1)/2), a tupla '(inf, None)'.
+    '''
+
+    if neighbors is None:
+        neighbors = neighbor_lists(dist, 10)
+
+    tours = []
+    forbidden = np.array([], dtype=np.int64)
+    for _ in range(K):
+        tour = complete_tour(
+            dist, neighbors, [[] for _ in range(dist.n)], forbidden
+        )
+        tours.append(tour)
+        forbidden = np.union1d(forbidden, tour_edge_ids(tour))
+
+    # Os passos finais de 'complete_tour' não garantem a disjunção, e uma
+    # solução inviável não pode servir de limitante superior
+    cost, tours = local_search(dist, tours, neighbors)
+    if not feasible_tours(tours, dist.n, K):
+        return math.inf, None
+    return cost, tours
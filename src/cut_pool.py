@@ -0,0 +1,118 @@
+'''
+Nesse módulo consta o repositório (pool) de cortes de eliminação de subciclo,
+que preserva as restrições encontradas pela callback entre as sucessivas
+otimizações do método do subgradiente.
+'''
+from subtour_elimination import subtour_expr
+
+class CutPool:
+    '''
+    Repositório de restrições de eliminação de subciclo. Cada corte é
+    identificado pelo conjunto de vértices do subciclo e pela rota à qual se
+    aplica, o que evita duplicatas. Os cortes registrados são inseridos no
+    modelo antes da próxima otimização e removidos caso permaneçam folgados por
+    'max_age' iterações consecutivas.
+
+    Args:
+        max_age: nº de iterações consecutivas com folga após as quais um corte
+            é descartado.
+        lazy: booleano que indica se os cortes serão inseridos como restrições
+            'lazy' (atributo 'Lazy' do Gurobi) ou como restrições comuns.
+    '''
+
+    def __init__(self, max_age=5, lazy=False):
+        self.max_age = max_age
+        self.lazy = lazy
+        # (conjunto de vértices, rota) -> restrição no modelo e idade do corte
+        self.cuts = {}
+
+    def __len__(self):
+        return len(self.cuts)
+
+    def add(self, cycle, tour_id):
+        '''
+        Registra um corte encontrado pela callback.
+
+        Args:
+            cycle: lista de vértices do subciclo.
+            tour_id: identificador da rota.
+
+        Returns:
+            Booleano que indica se o corte é novo.
+        '''
+
+        key = (frozenset(cycle), tour_id)
+        if key in self.cuts:
+            return False
+
+        self.cuts[key] = {'constr': None, 'age': 0}
+        return True
+
+    def export(self):
+        '''
+        Exporta os cortes registrados, para que sejam salvos em um checkpoint.
+
+        Returns:
+            Lista de tuplas com os vértices do subciclo e a rota do corte.
+        '''
+
+        return [(sorted(vertices), t) for vertices, t in self.cuts]
+
+    def load(self, cuts):
+        '''
+        Registra cortes exportados por 'export'.
+
+        Args:
+            cuts: lista de tuplas com os vértices do subciclo e a rota do corte.
+        '''
+
+        for cycle, t in cuts:
+            self.add(cycle, t)
+
+    def inject(self, model):
+        '''
+        Insere no modelo os cortes registrados que ainda não fazem parte dele.
+
+        Args:
+            model: modelo do K-TSP.
+        '''
+
+        for (vertices, t), cut in self.cuts.items():
+            if cut['constr'] is not None:
+                continue
+
+            cut['constr'] = model.addConstr(
+                subtour_expr(model, list(vertices), t) <= len(vertices) - 1
+            )
+            if self.lazy:
+                cut['constr'].Lazy = 1
+
+    def age(self, model):
+        '''
+        Atualiza a idade dos cortes presentes no modelo de acordo com a folga
+        na última solução e remove aqueles que excederam 'max_age'.
+
+        Args:
+            model: modelo do K-TSP, já otimizado.
+        '''
+
+        # Sem solução, não há folga para avaliar
+        if model.SolCount == 0:
+            return
+
+        expired = []
+        for key, cut in self.cuts.items():
+            if cut['constr'] is None:
+                continue
+
+            # Em uma solução inteira, um corte ativo tem folga nula
+            if cut['constr'].Slack > 0.5:
+                cut['age'] += 1
+            else:
+                cut['age'] = 0
+
+            if cut['age'] >= self.max_age:
+                expired.append(key)
+
+        for key in expired:
+            model.remove(self.cuts.pop(key)['constr'])
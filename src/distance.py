@@ -0,0 +1,171 @@
+'''
+Nesse módulo consta a representação compacta das distâncias de uma instância,
+armazenadas em um vetor condensado indexado pelo identificador fixo das arestas.
+'''
+import numpy as np
+
+# Raio da Terra e aproximação de pi definidos pelo TSPLIB
+TSPLIB_RRR = 6378.388
+TSPLIB_PI = 3.141592
+
+class DistanceMatrix:
+    '''
+    Matriz de distâncias simétrica armazenada como vetor condensado, em que a
+    aresta (i,j), i > j, ocupa a posição i*(i-1)/2 + j. O vetor pode ser um
+    'np.memmap', o que permite carregar instâncias grandes sob demanda.
+
+    Args:
+        n: nº de vértices.
+        vector: vetor com n*(n-1)/2 distâncias, na ordem dos identificadores
+            das arestas.
+    '''
+
+    def __init__(self, n, vector):
+        vector = np.asarray(vector, dtype=np.float64)
+        assert len(vector) == n * (n - 1) // 2
+        self.n = n
+        self.vector = vector
+
+    @classmethod
+    def from_dict(cls, dist, n):
+        '''
+        Constrói a matriz a partir de um dicionário de custo das arestas (i,j),
+        i > j.
+        '''
+
+        ei, ej = np.tril_indices(n, -1)
+        return cls(n, [dist[i, j] for i, j in zip(ei.tolist(), ej.tolist())])
+
+    @classmethod
+    def from_points(cls, points, metric='euclidean'):
+        '''
+        Constrói a matriz de distâncias entre pontos do plano, calculada em
+        blocos de linhas (ver 'condensed_chunks').
+        '''
+
+        points = np.asarray(points, dtype=np.float64)
+        n = len(points)
+        vector = np.empty(n * (n - 1) // 2)
+        for start, values in condensed_chunks(points, metric):
+            vector[start:start + len(values)] = values
+        return cls(n, vector)
+
+    def __getitem__(self, edge):
+        i, j = edge
+        if i < j:
+            i, j = j, i
+        return self.vector.item(i * (i - 1) // 2 + j)
+
+    def batch(self, i, j):
+        '''
+        Distâncias de várias arestas de uma só vez.
+
+        Args:
+            i, j: vetores de vértices das arestas, em qualquer ordem.
+
+        Returns:
+            Vetor com a distância de cada aresta (i[e], j[e]).
+        '''
+
+        i = np.asarray(i, dtype=np.int64)
+        j = np.asarray(j, dtype=np.int64)
+        hi = np.maximum(i, j)
+        lo = np.minimum(i, j)
+
+        # Pares com i == j têm distância nula
+        diagonal = hi == lo
+        idx = np.where(diagonal, 0, hi * (hi - 1) // 2 + lo)
+        return np.where(diagonal, 0.0, self.vector[idx])
+
+    def square(self):
+        '''
+        Matriz quadrada n x n de distâncias, com diagonal nula.
+        '''
+
+        matrix = np.zeros((self.n, self.n))
+        ei, ej = np.tril_indices(self.n, -1)
+        matrix[ei, ej] = self.vector
+        matrix[ej, ei] = self.vector
+        return matrix
+
+def as_distance_matrix(dist, n):
+    '''
+    Converte, se necessário, um dicionário de custo das arestas (i,j), i > j,
+    em uma 'DistanceMatrix'.
+
+    Args:
+        dist: dicionário de custo das arestas ou 'DistanceMatrix'.
+        n: nº de vértices.
+
+    Returns:
+        'DistanceMatrix' equivalente.
+    '''
+
+    if isinstance(dist, DistanceMatrix):
+        return dist
+    return DistanceMatrix.from_dict(dist, n)
+
+def _geo_radians(points):
+    # Coordenadas GEO do TSPLIB estão no formato DDD.MM (graus e minutos)
+    degrees = np.trunc(points)
+    return TSPLIB_PI * (degrees + 5.0 * (points - degrees) / 3.0) / 180.0
+
+def pairwise(a, b, metric='euclidean'):
+    '''
+    Distâncias entre cada ponto de 'a' e cada ponto de 'b', por broadcasting.
+
+    Args:
+        a, b: matrizes de coordenadas (nº de pontos x 2).
+        metric: 'euclidean' (distância Euclidiana real) ou um dos tipos do
+            TSPLIB: 'EUC_2D' (Euclidiana arredondada), 'ATT' (pseudo-
+            Euclidiana) ou 'GEO' (geográfica, em km).
+
+    Returns:
+        Matriz (len(a) x len(b)) de distâncias.
+    '''
+
+    if metric == 'GEO':
+        a, b = _geo_radians(a), _geo_radians(b)
+        q1 = np.cos(a[:, None, 1] - b[None, :, 1])
+        q2 = np.cos(a[:, None, 0] - b[None, :, 0])
+        q3 = np.cos(a[:, None, 0] + b[None, :, 0])
+        arc = np.arccos(np.clip(0.5 * ((1 + q1) * q2 - (1 - q1) * q3), -1, 1))
+        return np.floor(TSPLIB_RRR * arc + 1.0)
+
+    squared = ((a[:, None, :] - b[None, :, :])**2).sum(axis=2)
+    if metric == 'euclidean':
+        return np.sqrt(squared)
+    if metric == 'EUC_2D':
+        return np.floor(np.sqrt(squared) + 0.5)
+    if metric == 'ATT':
+        r = np.sqrt(squared / 10.0)
+        t = np.floor(r + 0.5)
+        return np.where(t < r, t + 1, t)
+    raise ValueError(f'métrica desconhecida: {metric}')
+
+def condensed_chunks(points, metric='euclidean', max_block=2**22):
+    '''
+    Calcula o vetor condensado de distâncias em blocos de linhas, sem
+    materializar a matriz n x n. A linha i do vetor condensado (arestas (i,j),
+    j < i) é contígua, logo cada bloco de linhas ocupa um trecho contíguo.
+
+    Args:
+        points: matriz de coordenadas (n x 2).
+        metric: métrica das distâncias (ver 'pairwise').
+        max_block: nº máximo de distâncias calculadas por bloco.
+
+    Returns:
+        Gerador de tuplas com a posição inicial do trecho no vetor condensado
+        e as distâncias do trecho.
+    '''
+
+    n = len(points)
+    rows = max(1, max_block // max(n, 1))
+    for first in range(1, n, rows):
+        last = min(n, first + rows)
+        block = pairwise(points[first:last], points[:last - 1], metric)
+
+        # Manter apenas as colunas j < i de cada linha i
+        i = np.arange(first, last)[:, None]
+        j = np.arange(last - 1)[None, :]
+        yield first * (first - 1) // 2, block[j < i]
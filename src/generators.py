@@ -0,0 +1,69 @@
+'''
+Nesse módulo constam os geradores de instâncias sintéticas do K-TSP: pontos
+uniformes, agrupados e em grade no quadrado [0,1]², gerados a partir de uma
+semente para que sejam reproduzíveis.
+'''
+import numpy as np
+
+def uniform_points(n, rng):
+    '''
+    n pontos uniformes no quadrado [0,1]².
+    '''
+
+    return rng.uniform(0, 1, size=(n, 2))
+
+def clustered_points(n, rng, clusters=None, spread=None):
+    '''
+    n pontos agrupados em torno de centros uniformes, com deslocamento
+    normal, como nas instâncias agrupadas do DIMACS TSP Challenge.
+
+    Args:
+        n: nº de pontos.
+        rng: gerador de números aleatórios do NumPy.
+        clusters: nº de grupos. Se 'None', n / 100 (ao menos 1).
+        spread: desvio padrão do deslocamento. Se 'None', 1 / sqrt(n).
+    '''
+
+    clusters = clusters or max(1, n // 100)
+    spread = spread or 1.0 / np.sqrt(n)
+    centers = rng.uniform(0, 1, size=(clusters, 2))
+    points = centers[rng.integers(clusters, size=n)]
+    return np.clip(points + rng.normal(0, spread, size=(n, 2)), 0, 1)
+
+def grid_points(n, rng, jitter=1e-3):
+    '''
+    n pontos nas primeiras posições de uma grade quadrada, com uma pequena
+    perturbação aleatória que desfaz os empates entre distâncias.
+    '''
+
+    side = int(np.ceil(np.sqrt(n)))
+    cells = np.arange(n)
+    points = np.stack((cells % side, cells // side), axis=1) / max(side - 1, 1)
+    return points + rng.uniform(-jitter, jitter, size=(n, 2))
+
+GENERATORS = {
+    'uniform': uniform_points,
+    'clustered': clustered_points,
+    'grid': grid_points,
+}
+
+def generate_instance(kind, n, seed=None, metric='euclidean'):
+    '''
+    Gera uma instância sintética no formato aceito por
+    'instance_io.save_instances', que calcula as distâncias em blocos.
+
+    Args:
+        kind: tipo de instância ('uniform', 'clustered' ou 'grid').
+        n: nº de vértices.
+        seed: semente do gerador de números aleatórios.
+        metric: métrica das distâncias (ver 'distance.pairwise').
+
+    Returns:
+        Dicionário com 'n', 'points', 'metric' e 'name'.
+    '''
+
+    points = GENERATORS[kind](n, np.random.default_rng(seed))
+    return {
+        'n': n, 'points': points, 'metric': metric,
+        'name': f'{kind}-{n}' + ('' if seed is None else f'-{seed}'),
+    }
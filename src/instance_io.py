@@ -0,0 +1,101 @@
+'''
+Nesse módulo consta o formato compacto de armazenamento das instâncias: um
+arquivo '.npy' com os vetores condensados de distâncias de todas as instâncias,
+concatenados, e um índice '.json' com a posição de cada uma no vetor. O '.npy'
+é mapeado em memória, de modo que cada instância só é lida ao ser acessada.
+'''
+import json
+import pickle
+import numpy as np
+from distance import DistanceMatrix, condensed_chunks
+
+def save_instances(prefix, instances):
+    '''
+    Salva instâncias no formato compacto ('<prefix>.npy' e '<prefix>.json').
+
+    Args:
+        prefix: caminho dos arquivos, sem extensão.
+        instances: lista de dicionários com o nº de vértices 'n' e as
+            distâncias 'dist' (dicionário de custo das arestas ou
+            'DistanceMatrix') ou as coordenadas 'points' e a métrica 'metric'
+            (ver 'distance.pairwise'). Nesse caso, as distâncias são
+            calculadas em blocos e escritas diretamente no arquivo. O nome
+            'name' da instância, se houver, é registrado no índice.
+    '''
+
+    index = []
+    offset = 0
+    for instance in instances:
+        n = instance['n']
+        size = n * (n - 1) // 2
+        entry = {'n': n, 'offset': offset, 'size': size}
+        if 'name' in instance:
+            entry['name'] = instance['name']
+        index.append(entry)
+        offset += size
+
+    # Escrever os vetores diretamente no arquivo mapeado em memória
+    data = np.lib.format.open_memmap(
+        prefix + '.npy', mode='w+', dtype=np.float64, shape=(offset,)
+    )
+    for entry, instance in zip(index, instances):
+        if 'points' in instance:
+            chunks = condensed_chunks(
+                np.asarray(instance['points'], dtype=np.float64),
+                instance.get('metric', 'euclidean')
+            )
+            for start, values in chunks:
+                start += entry['offset']
+                data[start:start + len(values)] = values
+            continue
+
+        dist = instance['dist']
+        if not isinstance(dist, DistanceMatrix):
+            dist = DistanceMatrix.from_dict(dist, entry['n'])
+        data[entry['offset']:entry['offset'] + entry['size']] = dist.vector
+    data.flush()
+    del data
+
+    with open(prefix + '.json', 'w') as fp:
+        json.dump(index, fp)
+
+class InstanceStore:
+    '''
+    Coleção de instâncias salvas no formato compacto, carregadas sob demanda.
+    Aceita também o formato antigo ('.pkl' com dicionários de distâncias), que
+    é convertido para 'DistanceMatrix' ao ser lido.
+
+    Args:
+        path: caminho dos arquivos, sem extensão, ou de um arquivo '.pkl'.
+    '''
+
+    def __init__(self, path):
+        if path.endswith('.pkl'):
+            with open(path, 'rb') as fp:
+                self._legacy = pickle.load(fp)
+            self.index = [{'n': inst['n']} for inst in self._legacy]
+            self._data = None
+        else:
+            with open(path + '.json') as fp:
+                self.index = json.load(fp)
+            self._legacy = None
+            self._data = np.load(path + '.npy', mmap_mode='r')
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, idx):
+        n = self.index[idx]['n']
+
+        if self._legacy is not None:
+            dist = DistanceMatrix.from_dict(self._legacy[idx]['dist'], n)
+        else:
+            offset = self.index[idx]['offset']
+            size = self.index[idx]['size']
+            dist = DistanceMatrix(n, self._data[offset:offset + size])
+
+        return {'n': n, 'dist': dist}
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
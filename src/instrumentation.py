@@ -0,0 +1,124 @@
+'''
+Nesse módulo consta a instrumentação do método do subgradiente: medição do
+tempo de cada fase de uma iteração, observadores que recebem um registro por
+iteração (em memória, CSV ou JSONL) e um invólucro para o cProfile.
+'''
+import csv
+import time
+import cProfile
+import pstats
+from contextlib import contextmanager
+from checkpoint import JsonlWriter
+
+class PhaseTimer:
+    '''
+    Acumula o tempo gasto em cada fase nomeada, por meio de um gerenciador de
+    contexto: `with timer('fase'): ...`.
+    '''
+
+    def __init__(self):
+        self.times = {}
+
+    @contextmanager
+    def __call__(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[phase] = (
+                self.times.get(phase, 0.0) + time.perf_counter() - start
+            )
+
+    def reset(self):
+        self.times = {}
+
+class Observer:
+    '''
+    Interface dos observadores do método do subgradiente. 'on_iteration'
+    recebe o registro de cada iteração e 'on_finish' o dicionário da solução.
+    '''
+
+    def on_iteration(self, record):
+        pass
+
+    def on_finish(self, result):
+        pass
+
+class MemorySink(Observer):
+    '''
+    Guarda os registros das iterações na lista 'records'.
+    '''
+
+    def __init__(self):
+        self.records = []
+
+    def on_iteration(self, record):
+        self.records.append(record)
+
+class CsvSink(Observer):
+    '''
+    Escreve os registros das iterações em um arquivo CSV, cujas colunas são as
+    chaves do primeiro registro.
+
+    Args:
+        path: caminho do arquivo.
+    '''
+
+    def __init__(self, path):
+        self.fp = open(path, 'w', newline='')
+        self.writer = None
+
+    def on_iteration(self, record):
+        if self.writer is None:
+            self.writer = csv.DictWriter(
+                self.fp, fieldnames=list(record), extrasaction='ignore'
+            )
+            self.writer.writeheader()
+        self.writer.writerow(record)
+        self.fp.flush()
+
+    def on_finish(self, result):
+        self.fp.close()
+
+class JsonlSink(Observer):
+    '''
+    Escreve os registros das iterações em um arquivo JSONL, em modo de
+    acréscimo (ver 'JsonlWriter').
+
+    Args:
+        path: caminho do arquivo.
+    '''
+
+    def __init__(self, path):
+        self.writer = JsonlWriter(path)
+
+    def on_iteration(self, record):
+        self.writer.write(record)
+
+    def on_finish(self, result):
+        self.writer.close()
+
+def profiled(fn, *args, output=None, top=30, **kwargs):
+    '''
+    Executa uma função sob o cProfile.
+
+    Args:
+        fn: função a ser executada com os argumentos restantes.
+        output: caminho em que as estatísticas são salvas (formato do
+            'pstats'). Se 'None', as 'top' funções de maior tempo acumulado são
+            impressas.
+        top: nº de funções impressas.
+
+    Returns:
+        Retorno de 'fn'.
+    '''
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+
+    if output is not None:
+        profiler.dump_stats(output)
+    else:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
+
+    return result
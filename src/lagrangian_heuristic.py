@@ -3,21 +3,36 @@ Nesse módulo consta a implementação da heurística lagrangiana para o K-TSP.
 '''
 
 import math
+import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from itertools import permutations
-from heapq import *
+import numpy as np
+from construction import (
+    complete_tour, edge_ids, feasible_tours, tour_edge_ids
+)
+from distance import DistanceMatrix, as_distance_matrix
+from local_search import neighbor_lists
 
 def tours_cost(dist, tours):
     '''
     Calcula a distância de k tours.
 
     Args:
-        dist: Dicionário de custo das arestas (i,j), i >= j.
+        dist: Dicionário de custo das arestas (i,j), i >= j, ou 
+            'DistanceMatrix'.
         tours: Lista contendo k tours.
 
     Returns:
         Distancia total dos tours.
     '''
 
+    # Consulta vetorizada das arestas de cada tour
+    if isinstance(dist, DistanceMatrix):
+        return float(
+            np.sum([dist.batch(tour, tour[1:] + tour[:1]).sum() for tour in tours])
+        )
+
     sum = 0
     for tour in tours:
         edges = zip(tour,tour[1:] + [tour[0]])
@@ -29,197 +44,321 @@ def tours_cost(dist, tours):
 def get_dist(dist, i, j):
     return dist[max(i,j),min(i,j)]
 
-def lagrangian_heuristic(dist, tours, n):
+def lagrangian_heuristic_assymmetric(dist, tours, n, neighbors, rng=None):
+    '''
+    Corrige os tours em sequência: o primeiro é fixo e, em cada um dos
+    seguintes, as arestas já usadas pelos tours anteriores são removidas. Os
+    caminhos restantes (fragmentos) são então reconectados de forma gulosa
+    pelas arestas livres mais baratas entre vizinhos mais próximos, com a
+    extremidade oposta de cada fragmento acessível em O(1) (ver
+    'construction.complete_tour').
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        tours: Lista contendo k tours, na ordem de correção.
+        n: nº de vértices.
+        neighbors: Lista de vizinhos mais próximos de cada vértice.
+        rng: 'random.Random' usado para desempatar candidatos de mesmo custo
+            de forma aleatória. Se 'None', o desempate é determinístico.
+
+    Returns:
+        Lista com custo dos novos tours e lista dos tours corrigidos. Se a
+        correção não eliminar todas as arestas repetidas, o custo é infinito
+        e a lista de tours é vazia.
+    '''
+
+    # O primeiro tour é fixo
+    tours_new = [list(tours[0])]
+    forbidden = np.sort(tour_edge_ids(tours_new[0]))
+
+    # Conserta cada um dos tours restantes
+    for tour_wrong in tours[1:]:
+        tour_wrong = np.asarray(tour_wrong)
+        succ = np.roll(tour_wrong, -1)
+        valid = ~np.isin(edge_ids(tour_wrong, succ), forbidden)
+
+        # Fragmentos formados pelas arestas ainda não usadas
+        adjacency = [[] for _ in range(n)]
+        for i, j in zip(tour_wrong[valid].tolist(), succ[valid].tolist()):
+            adjacency[i].append(j)
+            adjacency[j].append(i)
+
+        # Um tour sem arestas repetidas não precisa de correção
+        if valid.all():
+            tour_corrected = tour_wrong.tolist()
+        else:
+            tour_corrected = complete_tour(
+                dist, neighbors, adjacency, forbidden, rng
+            )
+
+        # Fixa o novo tour
+        forbidden = np.union1d(forbidden, tour_edge_ids(tour_corrected))
+        tours_new.append(tour_corrected)
+
+    # A reconexão não garante a disjunção, e tours inviáveis não podem ser
+    # usados como limitante superior
+    if not feasible_tours(tours_new, n, len(tours)):
+        return [math.inf, []]
+    return [tours_cost(dist, tours_new), tours_new]
+
+# Instância usada pelos processos do pool da heurística
+_worker_dist = None
+_worker_neighbors = None
+
+def _init_worker(dist, neighbors):
+    global _worker_dist, _worker_neighbors
+    _worker_dist = dist
+    _worker_neighbors = neighbors
+
+def _repair_task(tours, n, seed):
+    rng = random.Random(seed) if seed is not None else None
+    return lagrangian_heuristic_assymmetric(
+        _worker_dist, tours, n, _worker_neighbors, rng
+    )
+
+def repair_pool(dist, workers, neighbors=None):
+    '''
+    Cria um pool de processos para a heurística lagrangiana. A instância e as
+    listas de vizinhos são enviadas uma única vez a cada processo, na sua
+    inicialização.
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        workers: nº de processos.
+        neighbors: Lista de vizinhos mais próximos de cada vértice. Se
+            'None', são usados os 10 mais próximos.
+
+    Returns:
+        'ProcessPoolExecutor' a ser repassado para 'lagrangian_heuristic'.
+    '''
+
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker,
+        initargs=(dist, neighbors or neighbor_lists(dist, 10))
+    )
+
+def lagrangian_heuristic(dist, tours, n, max_orderings=None, randomize=False,
+                         seed=None, executor=None, lower_bound=None,
+                         neighbors=None):
     '''
     Dados k tours com possível interseção nas arestas, remove as arestas
     repetidas e as substitui de forma gulosa por arestas de distâncias baixas.
+    A ordem em que os tours são corrigidos afeta o resultado, logo várias
+    ordens são avaliadas e a melhor é retornada.
 
     Args:
-        dist: Dicionário de custo das arestas (i,j), i >= j.
+        dist: Dicionário de custo das arestas (i,j), i >= j, ou 
+            'DistanceMatrix'.
         tours: Lista contendo k tours.
+        n: nº de vértices.
+        max_orderings: nº máximo de ordens avaliadas. Se k! exceder esse
+            valor, são sorteadas 'max_orderings' ordens distintas (incluindo
+            a original); se 'None', todas as k! ordens são avaliadas.
+        randomize: booleano que indica se os empates entre candidatos de
+            mesmo custo são desfeitos de forma aleatória, o que diversifica
+            as correções de cada ordem.
+        seed: semente dos sorteios.
+        executor: pool de processos (ver 'repair_pool') em que as ordens são
+            avaliadas em paralelo. Se 'None', são avaliadas em sequência.
+        lower_bound: limitante inferior do problema. Se uma ordem atingir
+            esse custo, a solução é ótima e as demais são descartadas.
+        neighbors: Lista de vizinhos mais próximos de cada vértice, usada na
+            reconexão dos fragmentos. Se 'None', são usados os 10 mais
+            próximos.
 
     Returns:
-        Tupla com custo dos novos tours e lista dos tours corrigidos.
+        Tupla com custo dos novos tours e lista dos tours corrigidos. Se
+        nenhuma ordem produzir tours viáveis, o custo é infinito e a lista
+        de tours é vazia.
     '''
 
-    # Recupera as arestas de um tour
-    def to_edges(tour):
-        return zip(tour,tour[1:] + [tour[0]])
-
-    # Função auxiliar que corrige o segundo tour, retorna os tours corrigidos
-    # e o custo total.
-    def lagrangian_heuristic_assymmetric(tours):
-        tours_new = []
-
-        # O primeiro tour é fixo
-        tour_fix = tours[0]
-        tours_new.append(tour_fix.copy())
-        # Arestas de tour_fix
-        edges_fix = set(to_edges(tour_fix))
-
-        # Conserta cada um dos tours restantes
-        for tour_wrong in tours[1:]:
-
-            # Estruturas para representar os fragmentos corretos do tour_wrong:
-            # Vizinho de cada vértice (conectados por arestas que não estejam 
-            # fixas)
-            neighbors = {}
-            # Conjunto de arestas invalidas
-            invalid_edges = set()
-            # Conjunto de arestas validas
-            valid_edges = set()
-            # Pares de arestas candidatas para correção
-            candidates = []
-
-            for i in range(n):
-                neighbors[i] = []
-
-            # Para adicionar arestas
-            def add_edge(i,j):
-                # adiciona aresta entre i e j
-                neighbors[i].append(j)
-                neighbors[j].append(i)
-                # Se i e j são validas
-                if valid(i,j):
-                    valid_edges.add((i,j))
-                else:
-                    invalid_edges.add((i,j))
-
-            # Para gerar canditatos
-            def find_canditates(i,j):
-                if not valid(i,j):
-                    for (k,l) in invalid_edges:
-                        if not i in [k,l] and not j in [k,l]:
-                            heappush(candidates,
-                                     (get_dist(dist,i,k) +
-                                      get_dist(dist,j,l),(i,j),(k,l),False))
-                            heappush(candidates,
-                                     (get_dist(dist,i,l) +
-                                      get_dist(dist,j,k),(i,j),(k,l),True))
-
-            # Para remover arestas
-            def remove_edge(i,j):
-                # adiciona aresta entre i e j
-                neighbors[i].remove(j)
-                neighbors[j].remove(i)
-                # Se i e j são validas
-                if valid(i,j):
-                    valid_edges.discard((i,j))
-                else:
-                    invalid_edges.discard((i,j))
-
-            # Para encontar o final de um caminho
-            def end_of_path(i):
-                u = i
-                v = neighbors[i][0]
-                while len(neighbors[v]) > 1:
-                    if neighbors[v][0] == u:
-                        u = v
-                        v = neighbors[v][1]
-                    else:
-                        u = v
-                        v = neighbors[v][0]
-                return v
-
-            # Para verificar se (i,j) não esta fixo
-            def valid(i,j):
-                return (not (i, j) in edges_fix and not (j, i) in edges_fix)
-
-            edges = list(to_edges(tour_wrong))
-            for (i, j) in edges: # Para cada aresta do tour_wrong
-                add_edge(i,j)
-                find_canditates(i,j)
-
-            # Adiciona arestas até limpar o conjunto arestas invalidas,
-            # não permite ciclos menores que n
-
-            # Remove pares de arestas invalidas não consecutivas,
-            # da preferencia para adicionar arestas com custos menores
-            skip = set() # Candidatos deixados para depois
-            while len(candidates) > 0:
-
-                (_, (i,j), (k,l), flip) = heappop(candidates)
-
-                # Uma das arestas já foi substituida
-                if not (i,j) in invalid_edges or not (k,l) in invalid_edges:
-                    continue
-
-                # Trocar as arestas forma um ciclo
-                remove_edge(i,j)
-                remove_edge(k,l)
-                if (end_of_path(i) == l) == flip:
-                    if (min((i,j),(k,l)), max((i,j),(k,l))) in skip:
-                        flip = not flip
-                    else:
-                        skip.add((min((i,j),(k,l)), max((i,j),(k,l))))
-                        add_edge(i,j)
-                        add_edge(k,l)
-                        continue
-
-                # Substitue ambas as arestas
-                # (pelo menos uma das novas é valida)
-                if flip:
-                    add_edge(i,l)
-                    find_canditates(i,l)
-                    add_edge(j,k)
-                    find_canditates(j,k)
-                else:
-                    add_edge(i,k)
-                    find_canditates(i,k)
-                    add_edge(j,l)
-                    find_canditates(j,l)
-
-            # Se não possue mais arestas invalidas não consecutivas...
-            while len(invalid_edges) > 0:
-                (i,j) = next(iter(invalid_edges))
-                # ...encontra uma valida para remover
-                for (k,l) in iter(valid_edges):
-                    if not i in [k,l] and not j in [k,l]:
-                        remove_edge(i,j)
-                        remove_edge(k,l)
-                        if valid(i,k) and valid(j,l) and\
-                                end_of_path(i) == l:
-                            add_edge(i,k)
-                            add_edge(j,l)
-                            break
-                        if valid(i,l) and valid(j,k) and\
-                                end_of_path(i) == k:
-                            add_edge(i,l)
-                            add_edge(j,k)
-                            break
-                        add_edge(i,j)
-                        add_edge(k,l)
-
-            # Retorna o dicionário para uma lista
-            tour_corrected = [0]
-            u = 0
-            v = neighbors[0][0]
-            while v != 0:
-                tour_corrected.append(v)
-                if neighbors[v][0] == u:
-                    u = v
-                    v = neighbors[v][1]
-                else:
-                    u = v
-                    v = neighbors[v][0]
-
-            # Fixa o novo tour
-            edges_fix = edges_fix.union(set(zip(tour_corrected,tour_corrected[1:] + [tour_corrected[0]])))
-
-            tours_new.append(tour_corrected)
-
-        assert len(tour_corrected) == n
-        assert set(to_edges(tour_corrected)).isdisjoint(set(to_edges(tour_fix)))
-        return [tours_cost(dist, tours_new), tours_new]
-
-    # A ordem em que processamos os tours afeta o resultado,
-    # portanto testamos todas as ordens e escolhemos a melhor
+    # A matriz condensada dispensa a ordenação dos vértices em cada consulta
+    dist = as_distance_matrix(dist, n)
+    rng = random.Random(seed)
+    if neighbors is None and executor is None:
+        neighbors = neighbor_lists(dist, 10)
+
+    # Ordens de correção: todas, ou uma amostra quando k! é grande
+    K = len(tours)
+    if max_orderings is None or math.factorial(K) <= max_orderings:
+        orderings = list(permutations(range(K)))
+    else:
+        orderings = [tuple(range(K))]
+        sampled = {orderings[0]}
+        while len(orderings) < max_orderings:
+            order = tuple(rng.sample(range(K), K))
+            if order not in sampled:
+                sampled.add(order)
+                orderings.append(order)
+    seeds = [rng.getrandbits(32) if randomize else None for _ in orderings]
+
+    def done(cost):
+        return lower_bound is not None and\
+            cost <= lower_bound + 1e-9 * max(1.0, abs(lower_bound))
+
     tours_best = []
     cost_best = math.inf
-    for tours in permutations(tours):
-        (cost_new,tours_new) = lagrangian_heuristic_assymmetric(tours)
+
+    if executor is None:
+        for order, order_seed in zip(orderings, seeds):
+            order_rng = random.Random(order_seed) if randomize else None
+            (cost_new, tours_new) = lagrangian_heuristic_assymmetric(
+                dist, [tours[t] for t in order], n, neighbors, order_rng
+            )
+            if cost_new < cost_best:
+                tours_best = tours_new
+                cost_best = cost_new
+            if done(cost_best):
+                break
+
+        return (cost_best, tours_best)
+
+    futures = [
+        executor.submit(_repair_task, [tours[t] for t in order], n, order_seed)
+        for order, order_seed in zip(orderings, seeds)
+    ]
+    for future in as_completed(futures):
+        (cost_new, tours_new) = future.result()
         if cost_new < cost_best:
             tours_best = tours_new
             cost_best = cost_new
+        if done(cost_best):
+            for pending in futures:
+                pending.cancel()
+            break
+
+    return (cost_best, tours_best)
+
+def canonical_tour(tour):
+    '''
+    Forma canônica de um tour, independente do vértice inicial e do sentido
+    de percurso: o tour começa pelo menor vértice e segue para o menor dos
+    seus dois vizinhos.
+
+    Args:
+        tour: Lista de vértices do tour.
+
+    Returns:
+        Tupla de vértices.
+    '''
+
+    p = tour.index(min(tour))
+    tour = tour[p:] + tour[:p]
+    if len(tour) > 2 and tour[-1] < tour[1]:
+        tour = tour[:1] + tour[:0:-1]
+    return tuple(tour)
+
+class HeuristicCache:
+    '''
+    Memoização de uma heurística determinística aplicada aos tours de cada
+    iteração do método do subgradiente. Os resultados são guardados em um
+    cache LRU de tamanho limitado, indexado pela forma canônica dos tours (sem
+    considerar a ordem dos tours, o vértice inicial nem o sentido).
+
+    Opcionalmente, a heurística só é executada se as arestas dos tours
+    mudarem mais que uma fração 'threshold' em relação à última execução;
+    caso contrário, o último resultado, que também é uma solução viável, é
+    reaproveitado.
+
+    Args:
+        heuristic: função (dist, tours, n) que retorna a tupla com o custo e
+            a lista dos tours corrigidos.
+        maxsize: nº máximo de resultados guardados.
+        threshold: fração mínima das arestas dos tours que deve mudar para
+            que a heurística seja executada novamente.
+    '''
 
-    return (cost_best,tours_best)
+    def __init__(self, heuristic, maxsize=128, threshold=0.0):
+        self.heuristic = heuristic
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.entries = OrderedDict()
+        self.last = None
+        self.hits = 0
+        self.misses = 0
+        self.skips = 0
+
+    def __call__(self, dist, tours, n):
+        key = self.key(tours)
+        result = self.lookup(key)
+        if result is None:
+            result = self.store(key, self.heuristic(dist, tours, n))
+        return result
+
+    def key(self, tours):
+        '''
+        Chave dos tours no cache: as formas canônicas dos tours, ordenadas.
+        '''
+
+        return tuple(sorted(canonical_tour(list(tour)) for tour in tours))
+
+    def lookup(self, key):
+        '''
+        Consulta o cache, sem executar a heurística.
+
+        Args:
+            key: chave dos tours (ver 'key').
+
+        Returns:
+            Cópia do resultado guardado para os tours ou, se as arestas
+            mudaram pouco desde a última execução (ver 'threshold'), do
+            último resultado. Se a heurística precisa ser executada, 'None'.
+        '''
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self._copy(self.entries[key])
+
+        if self.threshold > 0 and self.last is not None:
+            last_edges, last_result = self.last
+            edges = self._edges(key)
+            if len(edges ^ last_edges) / (2 * len(edges)) <= self.threshold:
+                self.skips += 1
+                return self._copy(last_result)
+
+        self.misses += 1
+        return None
+
+    def store(self, key, result):
+        '''
+        Guarda o resultado da heurística para os tours de chave 'key',
+        executada fora do cache (por exemplo, em outro processo).
+
+        Returns:
+            Cópia do resultado.
+        '''
+
+        result = (result[0], [list(tour) for tour in result[1]])
+        if self.threshold > 0:
+            self.last = (self._edges(key), result)
+
+        if self.maxsize > 0:
+            self.entries[key] = result
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        return self._copy(result)
+
+    def _edges(self, key):
+        # Arestas dos tours, para comparar com a última execução
+        edges = set()
+        for t, tour in enumerate(key):
+            edges.update((t, min(i, j), max(i, j))
+                         for i, j in zip(tour, tour[1:] + tour[:1]))
+        return edges
+
+    def _copy(self, result):
+        # Os tours retornados podem ser modificados por quem os recebe
+        return (result[0], [list(tour) for tour in result[1]])
+
+    def stats(self):
+        '''
+        Estatísticas de uso do cache: acertos, falhas (execuções da
+        heurística), execuções evitadas pelo limiar e tamanho.
+        '''
+
+        return {
+            'cache_hits': self.hits, 'cache_misses': self.misses,
+            'cache_skips': self.skips, 'cache_size': len(self.entries),
+        }
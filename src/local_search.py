@@ -0,0 +1,216 @@
+'''
+Nesse módulo consta a busca local (2-opt e Or-opt) que melhora os tours
+retornados pela heurística lagrangiana, mantendo-os disjuntos nas arestas.
+'''
+from collections import deque
+import numpy as np
+
+def neighbor_lists(dist, k, chunk=256):
+    '''
+    Calcula os k vizinhos mais próximos de cada vértice, em blocos de linhas
+    para evitar materializar a matriz n x n.
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        k: nº de vizinhos por vértice.
+        chunk: nº de linhas processadas por bloco.
+
+    Returns:
+        Lista com os vizinhos de cada vértice, em ordem crescente de distância.
+    '''
+
+    n = dist.n
+    k = min(k, n - 1)
+    cols = np.arange(n)
+    neighbors = []
+
+    for start in range(0, n, chunk):
+        rows = np.arange(start, min(start + chunk, n))
+        block = dist.batch(rows[:, None], cols[None, :])
+        block[rows - start, rows] = np.inf
+
+        nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(block, nearest, axis=1), axis=1)
+        neighbors.extend(np.take_along_axis(nearest, order, axis=1).tolist())
+
+    return neighbors
+
+def local_search(dist, tours, neighbors, max_segment=3):
+    '''
+    Aplica movimentos 2-opt e Or-opt nos tours até que nenhum movimento
+    aprimorante seja encontrado. Os movimentos são restritos às listas de
+    vizinhos mais próximos, controlados por bits "don't look", e só inserem
+    arestas que não estejam em nenhum dos k tours, o que preserva a disjunção.
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        tours: Lista contendo k tours disjuntos nas arestas.
+        neighbors: Lista de vizinhos mais próximos de cada vértice.
+        max_segment: tamanho máximo dos segmentos movidos pelo Or-opt.
+
+    Returns:
+        Tupla com custo dos novos tours e lista dos tours melhorados.
+    '''
+
+    n = len(tours[0])
+    tours = [list(tour) for tour in tours]
+
+    # Posição de cada vértice em cada tour
+    positions = []
+    for tour in tours:
+        pos = [0] * n
+        for p, v in enumerate(tour):
+            pos[v] = p
+        positions.append(pos)
+
+    def key(i, j):
+        return (i, j) if i > j else (j, i)
+
+    # Arestas usadas por algum tour
+    used = set()
+    for tour in tours:
+        for p in range(n):
+            used.add(key(tour[p], tour[(p + 1) % n]))
+
+    # Vértices ativos (bits "don't look" desligados), por tour
+    queue = deque((t, v) for t in range(len(tours)) for v in range(n))
+    active = [[True] * n for _ in tours]
+
+    def activate(vertices):
+        for t in range(len(tours)):
+            for v in vertices:
+                if not active[t][v]:
+                    active[t][v] = True
+                    queue.append((t, v))
+
+    def replace_edges(removed, added):
+        for i, j in removed:
+            used.discard(key(i, j))
+        for i, j in added:
+            used.add(key(i, j))
+        activate({v for edge in removed + added for v in edge})
+
+    # Inverte o caminho entre as posições i e j (inclusive) do tour t,
+    # escolhendo o lado mais curto do ciclo
+    def reverse(t, i, j):
+        tour, pos = tours[t], positions[t]
+        inner = (j - i) % n + 1
+        if 2 * inner > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            inner = n - inner
+        for _ in range(inner // 2):
+            tour[i], tour[j] = tour[j], tour[i]
+            pos[tour[i]] = i
+            pos[tour[j]] = j
+            i = (i + 1) % n
+            j = (j - 1) % n
+
+    def two_opt(t, a):
+        tour, pos = tours[t], positions[t]
+        succ_a = tour[(pos[a] + 1) % n]
+        pred_a = tour[pos[a] - 1]
+
+        # Sentido direto: troca (a, succ a), (c, succ c) por
+        # (a, c), (succ a, succ c)
+        for c in neighbors[a]:
+            g1 = dist[a, succ_a] - dist[a, c]
+            if g1 <= 0:
+                break
+            succ_c = tour[(pos[c] + 1) % n]
+            if c == succ_a or succ_c == a:
+                continue
+            if key(a, c) in used or key(succ_a, succ_c) in used:
+                continue
+            if g1 + dist[c, succ_c] - dist[succ_a, succ_c] > 1e-10:
+                reverse(t, pos[succ_a], pos[c])
+                replace_edges(
+                    [(a, succ_a), (c, succ_c)], [(a, c), (succ_a, succ_c)]
+                )
+                return True
+
+        # Sentido inverso: troca (pred a, a), (pred c, c) por
+        # (a, c), (pred a, pred c)
+        for c in neighbors[a]:
+            g1 = dist[pred_a, a] - dist[a, c]
+            if g1 <= 0:
+                break
+            pred_c = tour[pos[c] - 1]
+            if c == pred_a or pred_c == a:
+                continue
+            if key(a, c) in used or key(pred_a, pred_c) in used:
+                continue
+            if g1 + dist[pred_c, c] - dist[pred_a, pred_c] > 1e-10:
+                reverse(t, pos[a], pos[pred_c])
+                replace_edges(
+                    [(pred_a, a), (pred_c, c)], [(a, c), (pred_a, pred_c)]
+                )
+                return True
+
+        return False
+
+    def or_opt(t, a):
+        tour, pos = tours[t], positions[t]
+
+        # Segmentos de tamanho 1 a 'max_segment' iniciados em a
+        for size in range(1, min(max_segment, n - 3) + 1):
+            segment = [tour[(pos[a] + s) % n] for s in range(size)]
+            first, last = segment[0], segment[-1]
+            prev = tour[pos[first] - 1]
+            nxt = tour[(pos[last] + 1) % n]
+            if key(prev, nxt) in used:
+                continue
+            removal_gain = (
+                dist[prev, first] + dist[last, nxt] - dist[prev, nxt]
+            )
+            if removal_gain <= 1e-10:
+                continue
+
+            # Inserir o segmento entre c e succ c, com c vizinho de uma das
+            # extremidades
+            for end in (first, last):
+                for c in neighbors[end]:
+                    if dist[end, c] >= removal_gain:
+                        break
+                    if c in segment or c == prev:
+                        continue
+                    succ_c = tour[(pos[c] + 1) % n]
+                    if succ_c in segment:
+                        continue
+
+                    # A extremidade 'end' fica adjacente a c
+                    other = last if end == first else first
+                    if key(c, end) in used or key(other, succ_c) in used:
+                        continue
+                    delta = (
+                        dist[c, end] + dist[other, succ_c] - dist[c, succ_c]
+                    )
+                    if removal_gain - delta <= 1e-10:
+                        continue
+
+                    # Reconstruir o tour com o segmento reposicionado
+                    moved = segment if end == first else segment[::-1]
+                    rest = [v for v in tour if v not in segment]
+                    p = rest.index(c) + 1
+                    tour[:] = rest[:p] + moved + rest[p:]
+                    for p, v in enumerate(tour):
+                        pos[v] = p
+
+                    replace_edges(
+                        [(prev, first), (last, nxt), (c, succ_c)],
+                        [(prev, nxt), (c, end), (other, succ_c)]
+                    )
+                    return True
+
+        return False
+
+    while queue:
+        t, a = queue.popleft()
+        active[t][a] = False
+        # Os vértices das arestas alteradas são reativados pelo movimento
+        if not two_opt(t, a):
+            or_opt(t, a)
+
+    cost = sum(
+        dist[tour[p], tour[(p + 1) % n]] for tour in tours for p in range(n)
+    )
+    return (cost, tours)
@@ -0,0 +1,189 @@
+'''
+Nesse módulo consta o cálculo vetorizado da 1-árvore mínima (limitante de
+Held-Karp), usada como relaxação do TSP sem a resolução de um MIP.
+'''
+import numpy as np
+
+def penalized_matrix(n, edges, weights):
+    '''
+    Constrói a matriz quadrada simétrica de custos a partir de um vetor
+    indexado pelos identificadores das arestas.
+
+    Args:
+        n: nº de vértices.
+        edges: tupla de vetores com os vértices i e j de cada aresta.
+        weights: vetor com o custo de cada aresta.
+
+    Returns:
+        Matriz n x n, com diagonal infinita.
+    '''
+
+    ei, ej = edges
+    matrix = np.empty((n, n))
+    matrix[ei, ej] = weights
+    matrix[ej, ei] = weights
+    np.fill_diagonal(matrix, np.inf)
+    return matrix
+
+def min_one_tree(C):
+    '''
+    Calcula a 1-árvore mínima: uma árvore geradora mínima sobre os vértices
+    1, ..., n-1 (algoritmo de Prim, vetorizado por linha) mais as duas arestas
+    de menor custo incidentes ao vértice 0.
+
+    Args:
+        C: matriz n x n de custos, com diagonal infinita.
+
+    Returns:
+        Tupla com o custo da 1-árvore e os vetores com os vértices i e j de
+        cada uma das suas n arestas. A árvore sobre 1, ..., n-1 é listada na
+        ordem de inserção do Prim, com j o pai de i.
+    '''
+
+    n = len(C)
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[[0, 1]] = True
+
+    # Menor custo de conexão de cada vértice à árvore e vértice que o realiza
+    key = C[1].copy()
+    key[in_tree] = np.inf
+    parent = np.ones(n, dtype=np.int64)
+
+    ti = np.empty(n, dtype=np.int64)
+    tj = np.empty(n, dtype=np.int64)
+    for k in range(n - 2):
+        v = int(np.argmin(key))
+        ti[k], tj[k] = v, parent[v]
+        in_tree[v] = True
+        key[v] = np.inf
+
+        better = ~in_tree & (C[v] < key)
+        key[better] = C[v, better]
+        parent[better] = v
+
+    # Duas arestas mais baratas incidentes ao vértice 0
+    nearest = np.argpartition(C[0, 1:], 1)[:2] + 1
+    ti[n - 2:] = nearest
+    tj[n - 2:] = 0
+
+    return float(C[ti, tj].sum()), ti, tj
+
+def one_tree_tour(n, ti, tj):
+    '''
+    Constrói um tour a partir de uma 1-árvore, percorrendo-a em profundidade
+    a partir do vértice 0 e ignorando vértices já visitados (atalhos).
+
+    Args:
+        n: nº de vértices.
+        ti, tj: vetores com os vértices de cada aresta da 1-árvore.
+
+    Returns:
+        Lista de vértices do tour.
+    '''
+
+    adjacency = [[] for _ in range(n)]
+    for i, j in zip(ti.tolist(), tj.tolist()):
+        adjacency[i].append(j)
+        adjacency[j].append(i)
+
+    tour = []
+    visited = [False] * n
+    stack = [0]
+    while stack:
+        v = stack.pop()
+        if visited[v]:
+            continue
+        visited[v] = True
+        tour.append(v)
+        stack.extend(w for w in reversed(adjacency[v]) if not visited[w])
+
+    return tour
+
+def path_maxima(C, ti, tj):
+    '''
+    Calcula, para cada par de vértices 1, ..., n-1, o maior custo de uma
+    aresta no caminho entre eles na árvore geradora da 1-árvore. O custo de
+    uma aresta fora da árvore menos esse valor é o aumento do custo da
+    1-árvore mínima quando a aresta é incluída.
+
+    Args:
+        C: matriz n x n de custos.
+        ti, tj: vetores da 1-árvore, na ordem retornada por 'min_one_tree'.
+
+    Returns:
+        Matriz n x n (a linha e a coluna do vértice 0 não são usadas).
+    '''
+
+    n = len(C)
+    M = np.full((n, n), - np.inf)
+
+    # Cada vértice é ligado ao seu pai, inserido antes dele na árvore
+    inserted = [1]
+    for k in range(n - 2):
+        v, p = ti[k], tj[k]
+        M[v, inserted] = np.maximum(M[p, inserted], C[v, p])
+        M[inserted, v] = M[v, inserted]
+        inserted.append(v)
+
+    return M
+
+def replacement_costs(C, ti, tj):
+    '''
+    Calcula, para cada aresta da 1-árvore, o custo da aresta mais barata que
+    a substitui quando ela é removida: a aresta que reconecta as duas partes
+    da árvore geradora ou, para as arestas incidentes ao vértice 0, a
+    terceira aresta mais barata incidente a ele.
+
+    Com os vértices na pré-ordem da árvore geradora, a subárvore de cada
+    vértice é um intervalo contíguo. Dos filhos para os pais (em ordem
+    inversa de inserção), cada vértice acumula o menor custo de uma aresta
+    entre a sua subárvore e cada vértice, e a substituição da aresta até o
+    pai é o menor desses custos fora do intervalo, o que requer O(n²) no
+    total.
+
+    Args:
+        C: matriz n x n de custos, com diagonal infinita.
+        ti, tj: vetores da 1-árvore, na ordem retornada por 'min_one_tree'.
+
+    Returns:
+        Vetor com o custo de substituição de cada aresta da 1-árvore.
+    '''
+
+    n = len(C)
+
+    # Tamanho da subárvore e posição na pré-ordem de cada vértice, a partir
+    # do vértice 1 (raiz). O vértice 0 ocupa a última posição
+    size = np.ones(n, dtype=np.int64)
+    for k in range(n - 3, -1, -1):
+        size[tj[k]] += size[ti[k]]
+    first = np.empty(n, dtype=np.int64)
+    free = np.empty(n, dtype=np.int64)
+    first[0], first[1], free[1] = n - 1, 0, 1
+    for k in range(n - 2):
+        v, p = ti[k], tj[k]
+        first[v] = free[p]
+        free[p] += size[v]
+        free[v] = first[v] + 1
+
+    # Custos das arestas fora da árvore, com as colunas na pré-ordem. As
+    # arestas até o vértice 0 não reconectam a árvore geradora
+    order = np.argsort(first)
+    R = C[:, order]
+    R[ti, first[tj]] = np.inf
+    R[tj, first[ti]] = np.inf
+    R[:, n - 1] = np.inf
+
+    replacement = np.empty(n)
+    for k in range(n - 3, -1, -1):
+        v, p = ti[k], tj[k]
+        lo, hi = first[v], first[v] + size[v]
+        replacement[k] = min(R[v, :lo].min(initial=np.inf),
+                             R[v, hi:].min(initial=np.inf))
+        np.minimum(R[p], R[v], out=R[p])
+
+    # A aresta que deixa de ser uma das duas mais baratas do vértice 0
+    C0 = C[0, 1:].copy()
+    C0[ti[n - 2:] - 1] = np.inf
+    replacement[n - 2:] = C0.min()
+
+    return replacement
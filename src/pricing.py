@@ -0,0 +1,249 @@
+'''
+Nesse módulo consta a redução do grafo completo a um grafo esparso de arestas
+candidatas, usada pelo modelo esparso do K-TSP. A redução é certificada pelos
+custos reduzidos de uma relaxação linear do K-TSP (restrições de grau, de
+disjunção e de eliminação de subciclo), resolvida por geração de colunas, ou
+da relaxação de Held-Karp com os multiplicadores do método do subgradiente:
+uma aresta só é descartada se nenhuma solução que a utilize pode ter custo
+inferior ao de uma solução conhecida.
+'''
+import numpy as np
+import gurobipy as gp
+from gurobipy import GRB
+from construction import edge_ids, tour_edge_ids
+from one_tree import min_one_tree, path_maxima, penalized_matrix,\
+    replacement_costs
+from separation import connected_components
+from utils import edge_arrays
+
+def candidate_edges(neighbors, tours):
+    '''
+    Arestas candidatas iniciais: as arestas entre cada vértice e os seus
+    vizinhos mais próximos e as arestas das rotas de uma solução viável.
+
+    Args:
+        neighbors: Lista de vizinhos mais próximos de cada vértice.
+        tours: Lista de rotas.
+
+    Returns:
+        Vetor ordenado com os identificadores das arestas.
+    '''
+
+    i = np.repeat(np.arange(len(neighbors)), [len(v) for v in neighbors])
+    j = np.concatenate([np.asarray(v, dtype=np.int64) for v in neighbors])
+    ids = [edge_ids(i, j)] + [tour_edge_ids(tour) for tour in tours]
+    return np.unique(np.concatenate(ids))
+
+def price_edges(dist, K, active, ub, env, max_rounds=100, tol=1e-6):
+    '''
+    Geração de colunas sobre a relaxação linear do K-TSP, a partir das arestas
+    candidatas. O modelo linear é mantido entre as rodadas (e reotimizado a
+    partir da base anterior) e cresce com as colunas precificadas e os cortes
+    separados. A cada rodada, a relaxação é resolvida e:
+
+    - as componentes conexas do suporte de cada rota fornecem restrições de
+      eliminação de subciclo violadas;
+    - as duais 'y' (grau), 'w' (disjunção) e 's' (subciclo) definem o custo
+      reduzido de cada aresta e de cada rota k, c_e - y_ik - y_jk - w_e -
+      sum(s_S, S contém i e j), calculado para todas as arestas do grafo
+      completo. As n arestas fora do modelo de menor custo reduzido negativo
+      são incluídas como colunas.
+
+    Para qualquer solução x do grafo completo, o custo é ao menos
+    lb + sum(rc_ek x_ek, rc_ek > 0), em que lb é o limitante dual de
+    Lagrange obtido das mesmas duais (válido mesmo antes da convergência).
+    Logo, ao final, toda aresta com custo reduzido maior ou igual a ub - lb
+    em todas as rotas pode ser descartada.
+
+    O resultado é um filtro estático das arestas do modelo (exato ou
+    relaxado) do K-TSP, que não recebe colunas durante a sua resolução. O
+    nº de arestas mantidas depende da diferença entre 'ub' e o limitante da
+    relaxação linear: em instâncias pequenas, em que essa diferença é grande
+    em relação aos custos reduzidos, a maioria das arestas é mantida.
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        K: nº de caixeiros viajantes.
+        active: vetor com os identificadores das arestas candidatas iniciais,
+            que deve conter as arestas da solução de custo 'ub'.
+        ub: custo de uma solução viável.
+        env: ambiente do Gurobi.
+        max_rounds: nº máximo de rodadas de separação e geração de colunas.
+        tol: tolerância dos custos reduzidos e do suporte da solução.
+
+    Returns:
+        Tupla com o vetor ordenado dos identificadores das arestas que podem
+        pertencer a uma solução de custo inferior a 'ub' e o limitante
+        inferior 'lb'.
+    '''
+
+    n = dist.n
+    all_ei, all_ej = edge_arrays(n)
+    all_cost = np.array(dist.vector)
+
+    # Relaxação linear com as restrições de grau, inicialmente sem colunas
+    lp = gp.Model(name='pricing', env=env)
+    deg = [[lp.addConstr(gp.LinExpr() == 2) for k in range(K)]
+           for i in range(n)]
+    deg_list = [deg[i][k] for i in range(n) for k in range(K)]
+
+    # Arestas do modelo, na ordem das colunas, com as variáveis de cada rota
+    # e a restrição de disjunção correspondentes, e restrições de eliminação
+    # de subciclo (vértices, rota, restrição)
+    cols = np.empty(0, dtype=np.int64)
+    xcols, disj, cuts = [], [], []
+
+    def add_columns(ids):
+        nonlocal cols
+        for e in ids.tolist():
+            i, j = int(all_ei[e]), int(all_ej[e])
+            row = []
+            for k in range(K):
+                constrs = [deg[i][k], deg[j][k]] + [
+                    c for inside, h, c in cuts
+                    if h == k and inside[i] and inside[j]
+                ]
+                row.append(lp.addVar(
+                    ub=1.0, obj=all_cost[e],
+                    column=gp.Column([1.0] * len(constrs), constrs)
+                ))
+            xcols.append(row)
+            if K > 1:
+                disj.append(lp.addConstr(gp.quicksum(row) <= 1))
+        cols = np.concatenate((cols, ids))
+
+    def add_cut(vertices, k):
+        inside = np.zeros(n, dtype=bool)
+        inside[vertices] = True
+        idx = np.flatnonzero(inside[all_ei[cols]] & inside[all_ej[cols]])
+        cuts.append((inside, k, lp.addConstr(
+            gp.LinExpr([1.0] * len(idx), [xcols[c][k] for c in idx])
+            <= len(vertices) - 1
+        )))
+
+    add_columns(np.unique(np.asarray(active, dtype=np.int64)))
+    lb, min_rc = - np.inf, np.full(len(all_cost), - np.inf)
+
+    for _ in range(max_rounds):
+        lp.optimize()
+        if lp.Status != GRB.OPTIMAL:
+            break
+        m = len(cols)
+        ei, ej = all_ei[cols], all_ej[cols]
+
+        # Duais, com o sinal das restrições de desigualdade imposto
+        y = np.array(lp.getAttr('Pi', deg_list)).reshape(n, K).T
+        w = np.minimum(0.0, lp.getAttr('Pi', disj)) if disj else np.zeros(m)
+        s = np.minimum(0.0, lp.getAttr('Pi', [c for _, _, c in cuts]))\
+            if cuts else []
+
+        # Custos reduzidos (K x nº de arestas do grafo completo) e parcela
+        # constante do limitante dual
+        rc = all_cost[None, :] - y[:, all_ei] - y[:, all_ej]
+        rc[:, cols] -= w
+        bound = 2 * y.sum() + w.sum()
+        for (inside, k, _), sigma in zip(cuts, s):
+            if sigma == 0:
+                continue
+            rc[k, inside[all_ei] & inside[all_ej]] -= sigma
+            bound += sigma * (inside.sum() - 1)
+        lb = bound + np.minimum(rc, 0.0).sum()
+        min_rc = rc.min(axis=0)
+
+        # Separação heurística: componentes conexas das arestas com x acima
+        # de cada limiar. No suporte (menor limiar), toda componente de um
+        # grafo desconexo viola a sua restrição de eliminação de subciclo.
+        # Como as rotas são simétricas, cada corte é incluído em todas elas
+        x = np.array(lp.getAttr('x', [v for row in xcols for v in row]))
+        x = x.reshape(m, K).T
+        found = set()
+        for k in range(K):
+            for threshold in (tol, 0.3, 0.5, 0.7, 1 - tol):
+                support = x[k] > threshold
+                for c in connected_components(n, ei[support], ej[support]):
+                    if len(c) < 3 or len(c) == n or frozenset(c) in found:
+                        continue
+                    inside = np.zeros(n, dtype=bool)
+                    inside[c] = True
+                    if x[k, inside[ei] & inside[ej]].sum() > len(c) - 1 + tol:
+                        found.add(frozenset(c))
+
+        # Precificação: incluir as n arestas fora do modelo de menor custo
+        # reduzido negativo
+        inactive = np.ones(len(all_cost), dtype=bool)
+        inactive[cols] = False
+        priced = np.flatnonzero(inactive & (min_rc < -tol))
+        priced = priced[np.argsort(min_rc[priced])[:n]]
+
+        if not found and len(priced) == 0:
+            break
+        for c in found:
+            for k in range(K):
+                add_cut(np.array(sorted(c)), k)
+        add_columns(priced)
+
+    # Arestas que podem pertencer a uma solução melhor que 'ub'. As arestas
+    # do modelo de custo reduzido alto também são descartadas
+    keep = min_rc < ub - lb + tol * max(1.0, abs(ub))
+    return np.flatnonzero(keep), lb
+
+def lagrangian_fixing(dist, K, u, ub, tol=1e-6):
+    '''
+    Fixação de variáveis pelos custos reduzidos da relaxação de Held-Karp do
+    K-TSP (ver 'subproblems.OneTreeSubproblem'), com multiplicadores 'u'
+    quaisquer, tipicamente os do melhor limitante do método do subgradiente.
+
+    Seja L o limitante dos multiplicadores e c' os custos penalizados da
+    1-árvore mínima, idêntica para as K rotas:
+
+    - incluir uma aresta e fora da 1-árvore em uma das rotas aumenta o custo
+      da 1-árvore dessa rota em pelo menos c'_e menos o maior custo no
+      caminho da árvore entre os seus vértices (ou menos a maior das duas
+      arestas do vértice 0). Se esse limitante excede 'ub', a aresta é
+      eliminada;
+    - excluir uma aresta e da 1-árvore de todas as rotas aumenta o custo de
+      cada uma em pelo menos o custo de substituição menos c'_e. Se K vezes
+      esse aumento somado a L excede 'ub', alguma rota usa a aresta, que é
+      fixada (sum_k x_ek = 1).
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        K: nº de caixeiros viajantes.
+        u: multiplicadores das arestas, na ordem dos identificadores fixos,
+            seguidos dos multiplicadores dos vértices.
+        ub: custo de uma solução viável.
+        tol: tolerância relativa da comparação com 'ub'.
+
+    Returns:
+        Tupla com o vetor ordenado dos identificadores das arestas que podem
+        pertencer a uma solução de custo inferior ou igual a 'ub', o vetor
+        ordenado das arestas fixadas e o limitante inferior L.
+    '''
+
+    n = dist.n
+    ei, ej = edge_arrays(n)
+    m = len(ei)
+    u_edges, pi = u[:m], u[m:]
+
+    # 1-árvore mínima com os custos penalizados
+    C = penalized_matrix(
+        n, (ei, ej), np.asarray(dist.vector) + u_edges + pi[ei] + pi[ej]
+    )
+    tree_cost, ti, tj = min_one_tree(C)
+    lb = K * tree_cost - float(u_edges.sum()) - 2 * K * float(pi.sum())
+    slack = ub - lb + tol * max(1.0, abs(ub))
+
+    # Aumento do custo da 1-árvore ao incluir cada aresta. O vértice 0 é
+    # sempre o menor da aresta (ej)
+    increase = C[ei, ej] - path_maxima(C, ti, tj)[ei, ej]
+    at_root = ej == 0
+    increase[at_root] = C[ei[at_root], 0] - C[ti[n - 2:], 0].max()
+    tree = edge_ids(ti, tj)
+    increase[tree] = 0.0
+    keep = np.flatnonzero(increase <= slack)
+
+    # Aumento do custo de cada 1-árvore ao excluir as suas arestas
+    removal = replacement_costs(C, ti, tj) - C[ti, tj]
+    fixed = np.unique(tree[K * removal > slack])
+
+    return keep, fixed, lb
@@ -0,0 +1,112 @@
+'''
+Nesse módulo consta a execução de várias instâncias do K-TSP em paralelo, em
+um pool de processos. Cada processo mantém um único ambiente do Gurobi,
+reaproveitado por todos os modelos que resolve, e o nº de threads de cada um
+é limitado para que os processos não disputem os mesmos núcleos.
+'''
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+import gurobipy as gp
+from instance_io import InstanceStore
+
+# Ambiente do Gurobi do processo atual
+_env = None
+
+def make_env(threads=0):
+    '''
+    Função que cria um ambiente do Gurobi silencioso.
+
+    Args:
+        threads: nº de threads usadas por cada otimização (0 deixa a escolha
+            para o Gurobi).
+
+    Returns:
+        Ambiente iniciado.
+    '''
+
+    env = gp.Env(empty = True)
+    env.setParam('OutputFlag', 0)
+    env.setParam('Threads', threads)
+    env.start()
+    return env
+
+def _init_worker(threads):
+    global _env
+    _env = make_env(threads)
+
+def _solve_instance(path, idx, K, checkpoint_dir, resume, options):
+    # Importado aqui para que o processo não dependa do '__main__' do pai
+    from solve import k_tsp
+
+    # Na relaxação, cada instância tem seu próprio checkpoint e registro das
+    # iterações
+    if checkpoint_dir is not None and options.get('relaxed'):
+        options = dict(options,
+            checkpoint=os.path.join(checkpoint_dir, f'instance-{idx}.ckpt'),
+            log=os.path.join(checkpoint_dir, f'instance-{idx}.jsonl'),
+            resume=resume,
+        )
+
+    instance = InstanceStore(path)[idx]
+    return idx, k_tsp(K, instance['n'], instance['dist'], env=_env, **options)
+
+def run_instances(path, K=2, workers=1, threads=None, checkpoint_dir=None,
+                  resume=False, **options):
+    '''
+    Resolve todas as instâncias de um arquivo, possivelmente em paralelo. As
+    soluções são coletadas na ordem em que terminam, mas retornadas na ordem
+    das instâncias, assim que todas as anteriores estiverem prontas.
+
+    Args:
+        path: caminho das instâncias (ver 'InstanceStore').
+        K: nº de caixeiros viajantes.
+        workers: nº de processos.
+        threads: nº de threads do Gurobi por processo. Se 'None', os núcleos
+            da máquina são divididos igualmente entre os processos.
+        checkpoint_dir: diretório em que são salvos os checkpoints e os
+            registros das iterações do método do subgradiente de cada
+            instância. Se 'None', não são salvos.
+        resume: booleano que indica se a relaxação de cada instância deve
+            continuar a partir do seu último checkpoint.
+        options: demais argumentos repassados a 'k_tsp'.
+
+    Returns:
+        Gerador de tuplas com o índice da instância e o dicionário da solução.
+    '''
+
+    total = len(InstanceStore(path))
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # Sem paralelismo, as instâncias são resolvidas no próprio processo
+    if workers == 1:
+        _init_worker(threads)
+        for idx in tqdm(range(total)):
+            yield _solve_instance(
+                path, idx, K, checkpoint_dir, resume, options
+            )
+        return
+
+    with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(threads,)) as executor:
+
+        futures = [
+            executor.submit(
+                _solve_instance, path, idx, K, checkpoint_dir, resume, options
+            )
+            for idx in range(total)
+        ]
+
+        # Soluções prontas, aguardando as de instâncias anteriores
+        done = {}
+        next_idx = 0
+        for future in tqdm(as_completed(futures), total=total):
+            idx, sol = future.result()
+            done[idx] = sol
+            while next_idx in done:
+                yield next_idx, done.pop(next_idx)
+                next_idx += 1
@@ -0,0 +1,217 @@
+'''
+Nesse módulo consta a identificação vetorizada de subciclos em soluções
+inteiras do K-TSP, usada tanto pela callback de eliminação de subciclo quanto
+pela reconstrução das rotas da solução, e a separação de restrições de
+eliminação de subciclo violadas por soluções fracionárias, por corte mínimo.
+'''
+import numpy as np
+
+def tour_cycles(n, ei, ej):
+    '''
+    Função que decompõe um grafo 2-regular nos seus ciclos.
+
+    Args:
+        n: nº de vértices.
+        ei, ej: vetores com os vértices das arestas selecionadas em uma rota.
+
+    Returns:
+        Lista de ciclos, cada um uma lista de vértices conectados com o
+        anterior e próximo da lista.
+    '''
+
+    # Vizinhos de cada vértice: ordenar as extremidades das arestas agrupa os
+    # dois vizinhos de cada vértice em posições consecutivas
+    ends = np.concatenate((ei, ej))
+    others = np.concatenate((ej, ei))
+    order = np.argsort(ends, kind='stable')
+    assert len(ends) == 2 * n and (ends[order] == np.repeat(np.arange(n), 2)).all()
+    neighbors = others[order].reshape(n, 2).tolist()
+
+    # Percorrer cada ciclo a partir do menor vértice ainda não visitado
+    visited = [False] * n
+    cycles = []
+    for start in range(n):
+        if visited[start]:
+            continue
+
+        cycle = [start]
+        visited[start] = True
+        prev, current = start, neighbors[start][0]
+        while current != start:
+            cycle.append(current)
+            visited[current] = True
+            a, b = neighbors[current]
+            prev, current = current, (b if a == prev else a)
+        cycles.append(cycle)
+
+    return cycles
+
+def solution_cycles(K, n, x_sol, edges):
+    '''
+    Função que decompõe cada rota de uma solução inteira nos seus ciclos.
+
+    Args:
+        K: nº de rotas na solução.
+        n: nº de vértices do grafo.
+        x_sol: vetor (K x nº de arestas) com os valores de 'x' na solução.
+        edges: tupla de vetores com os vértices i e j de cada aresta, na ordem
+            dos identificadores fixos.
+
+    Returns:
+        Lista com os ciclos de cada rota.
+    '''
+
+    ei, ej = edges
+    cycles = []
+    for t in range(K):
+        selected = x_sol[t] > 0.5
+        cycles.append(tour_cycles(n, ei[selected], ej[selected]))
+
+    return cycles
+
+def connected_components(n, ei, ej):
+    '''
+    Função que identifica as componentes conexas de um grafo qualquer, por
+    meio de uma estrutura de conjuntos disjuntos (union-find).
+
+    Args:
+        n: nº de vértices.
+        ei, ej: vetores com os vértices das arestas do grafo.
+
+    Returns:
+        Lista de componentes, cada uma uma lista de vértices.
+    '''
+
+    parent = list(range(n))
+
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    for i, j in zip(ei.tolist(), ej.tolist()):
+        a, b = find(i), find(j)
+        if a != b:
+            parent[a] = b
+
+    components = {}
+    for v in range(n):
+        components.setdefault(find(v), []).append(v)
+
+    return list(components.values())
+
+def min_cuts(W, threshold):
+    '''
+    Algoritmo de Stoer-Wagner para o corte mínimo global de um grafo com
+    pesos não-negativos. A cada fase, os vértices são ordenados por adjacência
+    máxima e o corte que separa o último vértice dos demais (corte da fase) é
+    avaliado; os dois últimos vértices são então contraídos. O menor dos cortes
+    das fases é o corte mínimo global.
+
+    Args:
+        W: matriz simétrica n x n de pesos, com diagonal nula.
+        threshold: são retornados todos os cortes das fases de valor inferior
+            a esse limiar, e não apenas o mínimo.
+
+    Returns:
+        Lista de tuplas com o valor de cada corte e a lista dos vértices de
+        um dos seus lados, ordenada pelo valor.
+    '''
+
+    n = len(W)
+    W = np.array(W, dtype=np.float64)
+    alive = np.ones(n, dtype=bool)
+    groups = [[v] for v in range(n)]
+    cuts = {}
+
+    for _ in range(n - 1):
+
+        # Ordem de adjacência máxima: o próximo vértice é o mais fortemente
+        # ligado aos já incluídos (conexão -inf para incluídos e contraídos)
+        first = int(np.flatnonzero(alive)[0])
+        conn = np.where(alive, W[first], - np.inf)
+        conn[first] = - np.inf
+        prev, last = first, first
+        for _ in range(int(alive.sum()) - 1):
+            prev, last = last, int(np.argmax(conn))
+            value = conn[last]
+            conn[last] = - np.inf
+            conn += W[last]
+
+        # Corte da fase: o último vértice (com os contraídos nele) contra os
+        # demais
+        if value < threshold:
+            side = frozenset(groups[last])
+            cuts[side] = min(value, cuts.get(side, np.inf))
+
+        # Contrair o último vértice no penúltimo
+        W[prev] += W[last]
+        W[:, prev] += W[:, last]
+        W[prev, prev] = 0.0
+        alive[last] = False
+        groups[prev] += groups[last]
+
+    return sorted(
+        ((value, sorted(side)) for side, value in cuts.items()),
+        key=lambda cut: cut[0]
+    )
+
+def fractional_subtours(n, ei, ej, x, min_violation=0.1, max_cuts=10,
+                        tol=1e-6):
+    '''
+    Separação das restrições de eliminação de subciclo violadas por uma rota
+    fracionária que satisfaz as restrições de grau 2. Nesse caso, a restrição
+    do conjunto S, x(E(S)) <= |S| - 1, equivale a x(delta(S)) >= 2, logo a
+    violação é 1 - x(delta(S)) / 2:
+
+    - se o suporte de x é desconexo, cada componente viola a restrição com
+      corte nulo;
+    - caso contrário, as arestas com x = 1 são contraídas (regra de
+      Padberg-Rinaldi, que preserva os cortes violados) e os cortes das fases
+      de Stoer-Wagner no grafo contraído fornecem os conjuntos violados.
+
+    Args:
+        n: nº de vértices.
+        ei, ej: vetores com os vértices de cada aresta.
+        x: vetor com os valores da rota em cada aresta.
+        min_violation: violação mínima de um corte.
+        max_cuts: nº máximo de conjuntos retornados.
+        tol: tolerância do suporte e das arestas contraídas.
+
+    Returns:
+        Lista de conjuntos violados, cada um uma lista de vértices (o menor
+        dos dois lados do corte), do mais ao menos violado.
+    '''
+
+    support = x > tol
+    ei, ej, x = ei[support], ej[support], x[support]
+    components = connected_components(n, ei, ej)
+    if len(components) > 1:
+        components.sort(key=len)
+        return components[:max_cuts]
+
+    # Contração das arestas com x = 1
+    label = np.empty(n, dtype=np.int64)
+    one = x >= 1 - tol
+    groups = connected_components(n, ei[one], ej[one])
+    for g, vertices in enumerate(groups):
+        label[vertices] = g
+
+    W = np.zeros((len(groups), len(groups)))
+    np.add.at(W, (label[ei], label[ej]), x)
+    W += W.T
+    np.fill_diagonal(W, 0.0)
+
+    subsets = []
+    for _, side in min_cuts(W, 2 * (1 - min_violation)):
+        vertices = [v for g in side for v in groups[g]]
+        if 2 * len(vertices) > n:
+            inside = np.ones(n, dtype=bool)
+            inside[vertices] = False
+            vertices = np.flatnonzero(inside).tolist()
+        subsets.append(vertices)
+        if len(subsets) == max_cuts:
+            break
+
+    return subsets
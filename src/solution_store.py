@@ -0,0 +1,253 @@
+'''
+Nesse módulo consta o armazenamento persistente (SQLite) das melhores soluções
+e multiplicadores de Lagrange de cada instância, indexados pelo conteúdo da
+instância. Assim, novas resoluções de uma mesma instância (em varreduras de
+parâmetros ou após mudanças no código) partem do melhor que já foi obtido.
+'''
+import time
+import pickle
+import hashlib
+import sqlite3
+from contextlib import contextmanager
+import numpy as np
+from construction import feasible_tours
+from lagrangian_heuristic import tours_cost
+
+def instance_hash(dist):
+    '''
+    Identificador de uma instância a partir do seu conteúdo: hash SHA-256 do
+    nº de vértices e do vetor condensado de distâncias.
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+
+    Returns:
+        String hexadecimal.
+    '''
+
+    digest = hashlib.sha256(np.int64(dist.n).tobytes())
+    digest.update(np.ascontiguousarray(dist.vector, dtype=np.float64).data)
+    return digest.hexdigest()
+
+def _valid_solution(dist, K, cost, tours):
+    # Solução viável cujo custo confere com os tours
+    if cost is None or tours is None or not feasible_tours(tours, dist.n, K):
+        return False
+    return abs(tours_cost(dist, tours) - cost) <= 1e-6 * max(1.0, abs(cost))
+
+class SolutionStore:
+    '''
+    Banco SQLite com duas tabelas, ambas indexadas pelo hash da instância
+    (ver 'instance_hash') e pelo nº de caixeiros K:
+
+    - 'solutions': melhor solução viável (custo e tours), melhor limitante
+      inferior e se a solução é comprovadamente ótima;
+    - 'multipliers': multiplicadores do melhor limitante inferior da
+      relaxação lagrangiana e estado da regra de passo, para cada formulação
+      (espaço dos multiplicadores).
+
+    As entradas só são substituídas por outras melhores, e cada tabela guarda
+    no máximo 'max_entries' entradas: as usadas há mais tempo são descartadas.
+    Uma solução só é guardada ou retornada se os seus tours forem K ciclos
+    hamiltonianos disjuntos nas arestas e o seu custo conferir com os tours,
+    de modo que uma solução inviável não se perpetua entre as execuções.
+    Cada operação abre a sua própria conexão, de modo que o banco pode ser
+    compartilhado pelos processos que resolvem instâncias em paralelo.
+
+    Args:
+        path: caminho do arquivo do banco.
+        max_entries: nº máximo de entradas de cada tabela.
+    '''
+
+    def __init__(self, path, max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+
+        with self._transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS solutions ('
+                'instance TEXT, K INTEGER, cost REAL, tours BLOB, lb REAL, '
+                'optimal INTEGER, used REAL, PRIMARY KEY (instance, K))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS multipliers ('
+                'instance TEXT, K INTEGER, formulation TEXT, lb REAL, u BLOB, '
+                'rule TEXT, step_rule BLOB, used REAL, '
+                'PRIMARY KEY (instance, K, formulation))'
+            )
+
+    @contextmanager
+    def _transaction(self):
+        # Transação com bloqueio de escrita desde o início, o que evita que
+        # dois processos leiam a mesma entrada e a sobrescrevam
+        conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def solution(self, instance, K, dist):
+        '''
+        Melhor solução conhecida de uma instância.
+
+        Args:
+            instance: hash da instância.
+            K: nº de caixeiros viajantes.
+            dist: 'DistanceMatrix' da instância, com a qual a solução é
+                verificada.
+
+        Returns:
+            Dicionário com custo 'cost', tours 'tours', limitante inferior
+            'lb' e se a solução é ótima 'optimal', ou 'None'. Se a solução
+            guardada for inválida, 'cost' e 'tours' são 'None'.
+        '''
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT cost, tours, lb, optimal FROM solutions '
+                'WHERE instance = ? AND K = ?', (instance, K)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE solutions SET used = ? WHERE instance = ? AND K = ?',
+                (time.time(), instance, K)
+            )
+
+        cost, tours, lb, optimal = row
+        tours = pickle.loads(tours) if tours else None
+        if not _valid_solution(dist, K, cost, tours):
+            cost, tours, optimal = None, None, False
+        return {
+            'cost': cost, 'tours': tours, 'lb': lb, 'optimal': bool(optimal),
+        }
+
+    def save_solution(self, instance, K, dist, cost=None, tours=None, lb=None,
+                      optimal=False):
+        '''
+        Registra uma solução e/ou um limitante inferior de uma instância. A
+        solução só substitui a guardada se tiver custo menor (ou se a
+        guardada for inválida), e o limitante se for maior. Soluções
+        inválidas são descartadas.
+
+        Args:
+            instance: hash da instância.
+            K: nº de caixeiros viajantes.
+            dist: 'DistanceMatrix' da instância, com a qual as soluções são
+                verificadas.
+            cost, tours: custo e tours de uma solução viável, se houver.
+            lb: limitante inferior, se houver.
+            optimal: booleano que indica se a solução é ótima.
+        '''
+
+        if not _valid_solution(dist, K, cost, tours):
+            cost, tours, optimal = None, None, False
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT cost, tours, lb, optimal FROM solutions '
+                'WHERE instance = ? AND K = ?', (instance, K)
+            ).fetchone()
+            if row is not None:
+                old_cost, old_tours, old_lb, old_optimal = row
+                old_tours = pickle.loads(old_tours) if old_tours else None
+                if not _valid_solution(dist, K, old_cost, old_tours):
+                    old_cost = None
+                if old_cost is not None and (cost is None or cost >= old_cost):
+                    optimal = old_optimal or (optimal and cost == old_cost)
+                    cost, tours = old_cost, old_tours
+                if old_lb is not None and (lb is None or lb < old_lb):
+                    lb = old_lb
+
+            conn.execute(
+                'INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    instance, K, cost,
+                    pickle.dumps(tours) if tours is not None else None,
+                    lb, int(bool(optimal)), time.time(),
+                )
+            )
+            self._evict(conn, 'solutions')
+
+    def multipliers(self, instance, K, formulation):
+        '''
+        Multiplicadores do melhor limitante inferior de uma instância.
+
+        Args:
+            instance: hash da instância.
+            K: nº de caixeiros viajantes.
+            formulation: identificador do espaço dos multiplicadores.
+
+        Returns:
+            Dicionário com o limitante 'lb', os multiplicadores 'u', o nome
+            da regra de passo 'rule' e o seu estado 'step_rule', ou 'None'.
+        '''
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT lb, u, rule, step_rule FROM multipliers '
+                'WHERE instance = ? AND K = ? AND formulation = ?',
+                (instance, K, formulation)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE multipliers SET used = ? '
+                'WHERE instance = ? AND K = ? AND formulation = ?',
+                (time.time(), instance, K, formulation)
+            )
+
+        lb, u, rule, step_rule = row
+        return {
+            'lb': lb, 'u': pickle.loads(u), 'rule': rule,
+            'step_rule': pickle.loads(step_rule),
+        }
+
+    def save_multipliers(self, instance, K, formulation, lb, u, rule=None,
+                         step_rule=None):
+        '''
+        Registra os multiplicadores de um limitante inferior, se o limitante
+        for maior que o guardado.
+
+        Args:
+            instance: hash da instância.
+            K: nº de caixeiros viajantes.
+            formulation: identificador do espaço dos multiplicadores.
+            lb: limitante inferior obtido com os multiplicadores.
+            u: vetor de multiplicadores.
+            rule: nome da regra de passo.
+            step_rule: estado da regra de passo (ver 'StepRule.export_state').
+        '''
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT lb FROM multipliers '
+                'WHERE instance = ? AND K = ? AND formulation = ?',
+                (instance, K, formulation)
+            ).fetchone()
+            if row is not None and row[0] >= lb:
+                return
+
+            conn.execute(
+                'INSERT OR REPLACE INTO multipliers '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    instance, K, formulation, lb,
+                    pickle.dumps(np.asarray(u, dtype=np.float64)), rule,
+                    pickle.dumps(step_rule), time.time(),
+                )
+            )
+            self._evict(conn, 'multipliers')
+
+    def _evict(self, conn, table):
+        conn.execute(
+            f'DELETE FROM {table} WHERE rowid NOT IN '
+            f'(SELECT rowid FROM {table} ORDER BY used DESC LIMIT ?)',
+            (self.max_entries,)
+        )
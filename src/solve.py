@@ -6,18 +6,35 @@ para análise do 2-TSP.
 
 import sys
 import argparse
+import hashlib
 import math
-import pickle
+import time
 import random
 from itertools import combinations
-from tqdm import tqdm
+import numpy as np
 import gurobipy as gp
 from gurobipy import GRB
-from subtour_elimination import subtour_elimination
+from subtour_elimination import subtour_elimination, user_cut_options
 from subgradient import subgradient
-from utils import build_tours_in_sol, shortest_cycle, print_solution
+from subproblems import (
+    AccuracySchedule, MIPSubproblem, OneTreeSubproblem, RelaxAndCutSubproblem
+)
+from construction import construct_tours, tour_edge_ids
+from local_search import neighbor_lists
+from pricing import candidate_edges, lagrangian_fixing, price_edges
+from distance import as_distance_matrix
+from solution_store import SolutionStore, instance_hash
+from checkpoint import JsonlWriter
+from step_rules import STEP_RULES
+from instance_io import InstanceStore
+from runner import make_env, run_instances
+from utils import build_tours_in_sol, edge_arrays, print_solution
 
-def k_tsp(K, n, dist, relaxed=False):
+def k_tsp(K, n, dist, relaxed=False, decomposed=False, one_tree=False,
+          env=None, max_cut_age=5, warm_start=True, sparse=False,
+          inexact=False, store=None, fixing=False, user_cuts=False,
+          symmetry_breaking=False, symmetry=None, relax_and_cut=False,
+          **subgradient_options):
     '''
     Função que define e resolve o modelo exato ou relaxado para o K-TSP, dada uma 
     determinada instância. Aqui, K-TSP generaliza o TSP e o 2-TSP para qualquer K, 
@@ -26,38 +43,224 @@ def k_tsp(K, n, dist, relaxed=False):
     Args:
         K: nº de caixeiros viajantes.
         n: nº de vértices do grafo.
-        dist: dicionário de custo das arestas (i,j), i >= j.
+        dist: dicionário de custo das arestas (i,j), i >= j, ou 
+            'DistanceMatrix'.
         relaxed: booleano que indica se será resolvido o modelo original ou a
             relaxação lagrangiana.
+        decomposed: booleano que indica se, na relaxação lagrangiana, o 
+            subproblema será decomposto em um único TSP com custos penalizados,
+            cuja rota é replicada para os K caixeiros.
+        one_tree: booleano que indica se a relaxação lagrangiana será a de
+            Held-Karp (1-árvores), que dispensa o MIP.
+        env: ambiente do Gurobi a ser reaproveitado. Se 'None', um novo
+            ambiente é criado.
+        max_cut_age: nº de iterações consecutivas com folga após as quais um
+            corte de eliminação de subciclo é descartado do pool, na
+            relaxação lagrangiana.
+        warm_start: booleano que indica se K tours disjuntos construídos
+            heuristicamente (ver 'construction') serão usados como solução
+            inicial e limitante superior do modelo exato, ou como limitante
+            superior inicial do método do subgradiente.
+        sparse: booleano que indica se o modelo conterá apenas as arestas que
+            podem pertencer a uma solução melhor que a construída, obtidas por
+            geração de colunas a partir dos vizinhos mais próximos (ver
+            'pricing'). Implica 'warm_start' e não se aplica à relaxação de
+            Held-Karp. Se a construção falhar, o modelo completo é usado. É
+            um filtro estático, aplicado antes da otimização, cujo tempo
+            conta no limite de tempo e no tempo de execução.
+        inexact: booleano que indica se, na relaxação lagrangiana, as
+            primeiras resoluções do subproblema MIP serão inexatas (ver
+            'AccuracySchedule'), com o 'ObjBound' como limitante.
+        store: 'SolutionStore' ou caminho do seu banco. Se indicado, a
+            melhor solução conhecida da instância é usada como solução
+            inicial (ou limitante superior inicial), a relaxação parte dos
+            multiplicadores do melhor limitante inferior já obtido, e as
+            soluções, limitantes e multiplicadores obtidos são registrados.
+        fixing: booleano que indica se, antes do modelo exato, a relaxação de
+            Held-Karp é resolvida pelo método do subgradiente, e os custos
+            reduzidos dos seus multiplicadores eliminam e fixam arestas (ver
+            'pricing.lagrangian_fixing'). O modelo exato reduzido parte da
+            melhor solução da relaxação e a usa como limite de corte, no
+            tempo restante.
+        user_cuts: booleano que indica se, no modelo exato e nos
+            subproblemas MIP da relaxação, as soluções fracionárias dos nós
+            da árvore de branch-and-bound também são separadas (ver
+            'subtour_elimination.user_cut_options'), o que fortalece os
+            limitantes dos nós.
+        symmetry_breaking: booleano que indica se, no modelo exato, as rotas
+            são ordenadas pelo menor vizinho do vértice 0, o que elimina as
+            K! representações de cada solução (permutações das rotas).
+        symmetry: valor do parâmetro 'Symmetry' do Gurobi no modelo exato
+            (-1 automático, 0 desligado, 1 conservador ou 2 agressivo). Se
+            'None', é usado o padrão do Gurobi.
+        relax_and_cut: booleano que indica se, na relaxação lagrangiana com
+            subproblema MIP, apenas as restrições de disjunção violadas em
+            alguma iteração são dualizadas, e as que permanecem folgadas são
+            desativadas (ver 'RelaxAndCutSubproblem'). Os multiplicadores
+            dependem da ordem das ativações e não são registrados em 'store'.
+        subgradient_options: demais argumentos repassados ao método do
+            subgradiente, na relaxação lagrangiana.
 
     Returns:
         Dicionário da solução, contendo a solução ótima se resolvido o problema
         original ou os melhores limitantes se resolvida a relaxação lagrangiana.
     '''
 
-    # Inicializar ambiente
-    env = gp.Env(empty = True)
-    env.setParam('OutputFlag', 0)
-    env.start()
+    dist = as_distance_matrix(dist, n)
+
+    # Melhor solução conhecida da instância, de execuções anteriores
+    known = None
+    if store is not None:
+        if isinstance(store, str):
+            store = SolutionStore(store)
+        store_key = (instance_hash(dist), K)
+        known = store.solution(*store_key, dist)
+        if known is not None and known['tours'] is None:
+            known = None
+
+    # Solução viável inicial, que fornece um limitante superior desde o início
+    # da otimização: a construída ou a conhecida, a que for melhor
+    warm_start = warm_start or sparse
+    if warm_start:
+        neighbors = neighbor_lists(dist, 10)
+        ub_cost, ub_tours = construct_tours(dist, K, neighbors)
+        if known is not None and known['cost'] < ub_cost:
+            ub_cost, ub_tours = known['cost'], known['tours']
+
+        # Sem solução viável, não há solução inicial nem limite de corte, e
+        # o modelo esparso, que depende do seu custo, dá lugar ao completo
+        if ub_tours is None:
+            warm_start = sparse = False
+    elif known is not None:
+        warm_start = True
+        ub_cost, ub_tours = known['cost'], known['tours']
+    if (relaxed or fixing) and warm_start:
+        subgradient_options.setdefault(
+            'initial_ub', {'cost': ub_cost, 'tours': ub_tours}
+        )
+
+    # Tempo de relógio das etapas anteriores ao modelo (relaxação da fixação
+    # e precificação das arestas), descontado do limite de tempo de 1800s e
+    # somado ao tempo de execução retornado
+    presolve_time = 0.0
+
+    def relax(subproblem, formulation):
+        # Método do subgradiente a partir dos melhores multiplicadores já
+        # obtidos na mesma formulação, registrando os novos limitantes. Sem
+        # formulação, os multiplicadores não são reaproveitados. O tempo das
+        # etapas anteriores conta no limite de tempo e no tempo de execução
+        if store is not None and formulation is not None:
+            saved = store.multipliers(*store_key, formulation)
+            if saved is not None and len(saved['u']) == len(subproblem.lower):
+                subgradient_options.setdefault('initial_multipliers', saved)
+
+        options = {'time_limit': max(0.0, 1800.0 - presolve_time)}
+        options.update(subgradient_options)
+        sol = subgradient(subproblem, dist, **options)
+        sol['runtime'] += presolve_time
+        multipliers = sol.pop('multipliers')
+
+        if store is not None:
+            best_lb, best_ub = sol['best_lb']['cost'], sol['best_ub']
+            if np.isfinite(best_lb) and formulation is not None:
+                store.save_multipliers(
+                    *store_key, formulation, best_lb, **multipliers
+                )
+            store.save_solution(
+                *store_key, dist, best_ub['cost'] if 'tours' in best_ub else None,
+                best_ub.get('tours'), best_lb
+            )
+        return sol, multipliers
+
+    # A relaxação de Held-Karp também dualiza as restrições de grau e não
+    # requer um modelo
+    if relaxed and one_tree:
+        subproblem = OneTreeSubproblem(dist, K, edge_arrays(n))
+        return relax(subproblem, 'one_tree')[0]
+
+    # Fixação de variáveis pelos custos reduzidos da relaxação de Held-Karp,
+    # cuja melhor solução passa a ser a solução inicial do modelo exato
+    fixed = np.empty(0, dtype=np.int64)
+    if fixing and not relaxed:
+        subgradient_options.setdefault('stall_window', 50)
+        subproblem = OneTreeSubproblem(dist, K, edge_arrays(n))
+        relaxation, multipliers = relax(subproblem, 'one_tree')
+        presolve_time += relaxation['runtime']
+        keep = np.arange(len(dist.vector))
+        fixing_lb = relaxation['best_lb']['cost']
+
+        # Sem solução viável, não há limite para os custos reduzidos e
+        # nenhuma aresta é eliminada ou fixada
+        if np.isfinite(relaxation['best_ub']['cost']):
+            warm_start = True
+            ub_cost = relaxation['best_ub']['cost']
+            ub_tours = relaxation['best_ub']['tours']
+            keep, fixed, fixing_lb = lagrangian_fixing(
+                dist, K, multipliers['u'], ub_cost
+            )
+
+    # Inicializar ambiente, se necessário
+    if env is None:
+        env = make_env()
+
+    # Com as restrições de disjunção dualizadas, as K cópias do subproblema
+    # possuem o mesmo custo penalizado, logo basta resolver um único TSP
+    copies = K
+    if relaxed and decomposed:
+        K = 1
+
+    # Arestas (i,j), i > j, na ordem dos seus identificadores fixos, e vetor
+    # de custos correspondente
+    ei, ej = edge_arrays(n)
+    cost = np.array(dist.vector)
+
+    # No modelo esparso, somente as arestas que podem melhorar a solução
+    # construída são mantidas. Qualquer solução de custo inferior usa apenas
+    # essas arestas, logo o ótimo (e o limitante) vale para o grafo completo
+    active = np.arange(len(cost))
+    if sparse:
+        pricing_start = time.perf_counter()
+        active, _ = price_edges(
+            dist, copies, candidate_edges(neighbors, ub_tours), ub_cost, env
+        )
+        active = np.union1d(
+            active, np.concatenate([tour_edge_ids(t) for t in ub_tours])
+        )
+        pricing_time = time.perf_counter() - pricing_start
+        presolve_time += pricing_time
+    if fixing and not relaxed:
+        active = np.intersect1d(active, keep)
+        if warm_start:
+            active = np.union1d(
+                active, np.concatenate([tour_edge_ids(t) for t in ub_tours])
+            )
+        fixed = np.intersect1d(fixed, active)
+    if len(active) < len(cost):
+        ei, ej, cost = ei[active], ej[active], cost[active]
+    edges = list(zip(ei.tolist(), ej.tolist()))
+
+    # Os multiplicadores das restrições de disjunção dependem do conjunto de
+    # arestas do modelo
+    formulation = 'disj'
+    if sparse:
+        formulation += '-' + hashlib.sha256(active.tobytes()).hexdigest()[:16]
 
     # Inicializar modelo
     model = gp.Model(name = str(K) + '-tsp', env = env)
 
-    # Adaptar o dicionário de distâncias de acordo com a quantidade de 
-    # caixeiros
-    distK = {
-        (i, j, k):  dist[i, j] 
-                    for i in range(n) for j in range(i) for k in range(K)
-    }
-
-    # Criar variáveis
-    xvars = model.addVars(distK.keys(), obj=distK, vtype=GRB.BINARY, name='x')
-    for i, j, k in xvars.keys():
-        xvars[j, i, k] = xvars[i, j, k]  # grafo não-orientado
+    # Criar variáveis, uma para cada aresta (i,j), i > j, de cada rota k. A
+    # ordem das variáveis (rota a rota) é a mesma dos vetores de custo
+    xvars = model.addVars(
+        [(i, j, k) for k in range(K) for i, j in edges],
+        obj=np.tile(cost, K).tolist(), vtype=GRB.BINARY, name='x'
+    )
 
-    # Restrições de grau 2, p/ cada rota k
+    # Restrições de grau 2, p/ cada rota k (grafo não-orientado)
     model.addConstrs(
-        (xvars.sum(i, '*', k) == 2 for i in range(n) for k in range(K)), 
+        (
+            xvars.sum(i, '*', k) + xvars.sum('*', i, k) == 2 
+            for i in range(n) for k in range(K)
+        ), 
         name='deg-2'
     )
 
@@ -65,94 +268,264 @@ def k_tsp(K, n, dist, relaxed=False):
     model._n = n
     model._K = K
     model._xvars = xvars
+    model._xlist = list(xvars.values())
+    model._edges = (ei, ej)
+    model._cost = cost
+    model._copies = copies
+    model._cut_pool = None
+    model._cb_stats = None
+    model._user_cuts = user_cut_options() if user_cuts else None
 
     # Indicar limite de tempo da otimização e callback a ser chamada após a
-    # solução ótima do modelo relaxado ser encontrada
+    # solução ótima do modelo relaxado ser encontrada. Os cortes de usuário
+    # requerem que o Gurobi traduza os cortes para o modelo pré-resolvido
     model.Params.lazyConstraints = 1
     model.Params.timeLimit = 1800.0
+    if user_cuts:
+        model.Params.PreCrush = 1
 
     # Restrições de disjunção entre arestas de diferentes rotas são incluídas no 
     # modelo do problema original...
     if not relaxed:
 
-        # Incluir restrições e otimizar
+        # Incluir restrições e otimizar. As arestas fixadas são usadas por
+        # exatamente uma rota
+        is_fixed = np.isin(active, fixed)
         model.addConstrs(
-            (xvars.sum(i, j, '*') <= 1 for i in range(n) for j in range(i)), 
+            (
+                xvars.sum(i, j, '*') <= 1
+                for (i, j), f in zip(edges, is_fixed) if not f
+            ),
             name='disj'
         )
-        model.optimize(subtour_elimination)
+        model.addConstrs(
+            (
+                xvars.sum(i, j, '*') == 1
+                for (i, j), f in zip(edges, is_fixed) if f
+            ),
+            name='fixed'
+        )
+
+        # Quebra de simetria: como as rotas são disjuntas, os menores
+        # vizinhos do vértice 0 em cada rota são distintos, e as rotas são
+        # ordenadas por eles. A aresta (i,0) só pode pertencer à rota k se a
+        # rota k-1 usar alguma aresta (h,0) com h < i. As somas das arestas
+        # (h,0) de cada rota são acumuladas em variáveis auxiliares, o que
+        # mantém o nº de coeficientes linear em n e K
+        if symmetry_breaking and K > 1:
+            m = len(cost)
+            at_root = np.flatnonzero(ej == 0)
+            at_root = at_root[np.argsort(ei[at_root])].tolist()
+            x = model._xlist
+
+            # prefix[k,p]: nº de arestas (h,0) da rota k antes da p-ésima
+            prefix = model.addVars(K - 1, len(at_root), ub=2.0, name='prefix')
+            for k in range(K - 1):
+                prefix[k, 0].UB = 0.0
+            model.addConstrs(
+                (
+                    prefix[k, p] ==
+                    prefix[k, p - 1] + x[k * m + at_root[p - 1]]
+                    for k in range(K - 1) for p in range(1, len(at_root))
+                ),
+                name='prefix'
+            )
+            model.addConstrs(
+                (
+                    x[k * m + e] <= prefix[k - 1, p]
+                    for k in range(1, K) for p, e in enumerate(at_root)
+                ),
+                name='symmetry'
+            )
+            if warm_start:
+                ub_tours = sorted(ub_tours, key=lambda tour: min(
+                    tour[tour.index(0) - 1],
+                    tour[(tour.index(0) + 1) % len(tour)]
+                ))
+        if symmetry is not None:
+            model.Params.Symmetry = symmetry
+
+        # O tempo das etapas anteriores conta no limite de tempo
+        model.Params.timeLimit = max(0.0, 1800.0 - presolve_time)
+
+        # Usar os tours construídos como solução inicial (MIP start) e seu
+        # custo como limite de corte dos nós da árvore de branch-and-bound.
+        # A folga evita que a própria solução inicial seja descartada
+        if warm_start:
+            start = np.zeros((K, len(cost)))
+            for k, tour in enumerate(ub_tours):
+                start[k, np.searchsorted(active, tour_edge_ids(tour))] = 1.0
+            model.setAttr('Start', model._xlist, start.ravel().tolist())
+            model.Params.Cutoff = ub_cost + 1e-6 * max(1.0, abs(ub_cost))
+
+        # Sem tempo restante (a relaxação da fixação pode esgotá-lo), o
+        # modelo não é otimizado
+        if model.Params.timeLimit > 0:
+            model.optimize(subtour_elimination)
+
+        # Recuperar solução. Se o tempo acabar antes da primeira solução do
+        # modelo, o resultado é a solução inicial, se houver, e o limitante é
+        # o da relaxação da fixação, se não houver o do modelo
+        optimized = model.Status != GRB.LOADED
+        if model.SolCount > 0:
+            x_sol = np.array(model.getAttr('x', model._xlist)).reshape(K, -1)
+            tours = build_tours_in_sol(K, n, x_sol, model._edges)
+            opt_cost = model.objVal
+        elif warm_start:
+            opt_cost, tours = ub_cost, ub_tours
+        else:
+            opt_cost, tours = math.inf, None
+        opt_lb = model.ObjBound if optimized else - math.inf
+        if fixing:
+            opt_lb = max(opt_lb, fixing_lb)
+        optimal = model.Status == GRB.OPTIMAL and model.SolCount > 0
 
-        # Recuperar solução
-        x_sol = model.getAttr('x', xvars)
-        tours = build_tours_in_sol(K, n, x_sol, xvars.keys())
+        # Registrar a solução e o limitante obtidos
+        if store is not None:
+            store.save_solution(
+                *store_key, dist, opt_cost if tours is not None else None,
+                tours, opt_lb, optimal=optimal
+            )
 
         # Retornar dicionário com solução ótima (ou limitantes caso o limite
         # de tempo seja alcançado) e tempo de execução
-        return {
-            'opt': {'cost': model.objVal, 'lb': model.ObjBound, 'tours': tours},
-            'runtime': model.Runtime,
+        sol = {
+            'opt': {'cost': opt_cost, 'lb': opt_lb, 'tours': tours},
+            'runtime': presolve_time + (model.Runtime if optimized else 0.0),
+            'node_count': model.NodeCount if optimized else 0,
         }
 
-    # ... e dualizadas na Relaxação Lagrangiana
+        # Com a fixação e a precificação, são registrados os seus tempos, o
+        # limitante da fixação e o tamanho do modelo reduzido
+        if sparse:
+            sol['pricing'] = {'edges': len(active), 'runtime': pricing_time}
+        if fixing:
+            sol['fixing'] = {
+                'lb': fixing_lb, 'edges': len(active), 'fixed': len(fixed),
+                'runtime': relaxation['runtime'],
+            }
+        return sol
+
+    # ... e dualizadas na Relaxação Lagrangiana: sob demanda, apenas as
+    # violadas pelas soluções do subproblema (completo ou decomposto), ...
+    elif relax_and_cut:
+        subproblem = RelaxAndCutSubproblem(
+            model, max_cut_age=max_cut_age,
+            schedule=AccuracySchedule() if inexact else None
+        )
+        return relax(subproblem, None)[0]
+
+    # ... ou todas
+    elif decomposed:
+
+        # O subproblema decomposto dispensa as variáveis do subgradiente, que
+        # é calculado diretamente a partir da rota replicada
+        subproblem = MIPSubproblem(
+            model, None, max_cut_age=max_cut_age,
+            schedule=AccuracySchedule() if inexact else None
+        )
+        return relax(subproblem, formulation)[0]
+
     else:
 
         # Criar variáveis para o subgradiente
-        sgvars = model.addVars(dist.keys(), lb= - GRB.INFINITY, vtype=GRB.INTEGER, name='sg')
-        for i, j in sgvars.keys():
-            sgvars[j, i] = sgvars[i, j]  # grafo não-orientado
+        sgvars = model.addVars(edges, lb= - GRB.INFINITY, vtype=GRB.INTEGER, name='sg')
 
         # As novas variáveis são associadas às restrições dualizadas, o que 
         # facilita na manipulação e extração desses valores
         model.addConstrs(
             (
                 sgvars[i,j] == - 1 + xvars.sum(i, j, '*') 
-                for i in range(n) for j in range(i)
+                for i, j in edges
             ),
             name='dualized'
         )
 
         # Resolver método do subgradiente
-        return subgradient(model, sgvars, dist)
-
-# O usuário indica pela linha do comando se ele deseja resolver o
-# 2-TSP de forma exata ou relaxada
-parser = argparse.ArgumentParser()
-parser.add_argument('--relaxed', default=False, action='store_true')
-args = parser.parse_args()
-relaxed = vars(args)['relaxed']
-
-# Carregar instâncias salvas em 'fixed_instances.pkl'
-with open("instances/fixed_instances.pkl", "rb") as fp:
-    instances = pickle.load(fp)
-
-dash = '===================='
-
-# Salvar output em um txt
-output_name = 'rel_output.txt' if relaxed else 'opt_output.txt'
-print(f"Soluções serão salvas em '{output_name}'")
-sys.stdout = open('outputs/' + output_name, 'w')
-
-for instance in tqdm(instances):
-    n = instance['n']
-    dist = instance['dist']
-
-    # Resolver 2-TSP de forma exata ou relaxada
-    sol_type = 'RELAXADA' if relaxed else 'EXATA'
-    print(f'\n{dash} SOLUÇÃO {sol_type} DO 2-TSP PARA N = {n} {dash}\n')
-    sol = k_tsp(2, n, dist, relaxed=relaxed)
-
-    if relaxed:
-        # Imprimir limitantes da relaxação lagrangiana
-        print('Melhor limitante inferior encontrado:')
-        print_solution(2, sol['best_lb']['tours'], sol['best_lb']['cost'])
-        print('Melhor limitante superior encontrado:')
-        print_solution(2, sol['best_ub']['tours'], sol['best_ub']['cost'])
+        subproblem = MIPSubproblem(
+            model, sgvars, max_cut_age=max_cut_age,
+            schedule=AccuracySchedule() if inexact else None
+        )
+        return relax(subproblem, formulation)[0]
 
-    else:
-        # Imprimir solução ótima
-        print_solution(2, sol['opt']['tours'], sol['opt']['cost'])
-        print('Melhor limitante inferior encontrado:', sol['opt']['lb'])
+if __name__ == '__main__':
+
+    # O usuário indica pela linha do comando se ele deseja resolver o
+    # 2-TSP de forma exata ou relaxada, e quantos processos e threads por
+    # processo devem ser usados
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--relaxed', default=False, action='store_true')
+    parser.add_argument('--decomposed', default=False, action='store_true')
+    parser.add_argument('--one-tree', default=False, action='store_true')
+    parser.add_argument('--sparse', default=False, action='store_true')
+    parser.add_argument('--inexact', default=False, action='store_true')
+    parser.add_argument('--relax-and-cut', default=False, action='store_true')
+    parser.add_argument('--step-rule', default='polyak', choices=STEP_RULES)
+    parser.add_argument('--stall-window', default=None, type=int)
+    parser.add_argument('--pipeline', default=0, type=int)
+    parser.add_argument('--store', default=None)
+    parser.add_argument('--fixing', default=False, action='store_true')
+    parser.add_argument('--user-cuts', default=False, action='store_true')
+    parser.add_argument('--symmetry-breaking', default=False,
+                        action='store_true')
+    parser.add_argument('--workers', default=1, type=int)
+    parser.add_argument('--threads', default=None, type=int)
+    parser.add_argument('--checkpoint-dir', default=None)
+    parser.add_argument('--resume', default=False, action='store_true')
+    args = parser.parse_args()
+    relaxed = vars(args)['relaxed']
+    decomposed = vars(args)['decomposed']
+
+    # Instâncias salvas em 'fixed_instances.npy', carregadas sob demanda
+    instances_path = 'instances/fixed_instances'
+    instances = InstanceStore(instances_path)
+
+    dash = '===================='
+
+    # Salvar output em um txt
+    output_name = 'rel_output.txt' if relaxed else 'opt_output.txt'
+    print(f"Soluções serão salvas em '{output_name}'")
+    sys.stdout = open('outputs/' + output_name, 'w')
+
+    # Resultados estruturados, um registro JSON por instância
+    results = JsonlWriter('outputs/' + output_name.replace('.txt', '.jsonl'))
+
+    # Resolver 2-TSP de forma exata ou relaxada. As soluções chegam na ordem
+    # das instâncias, independentemente da ordem em que terminam
+    solutions = run_instances(
+        instances_path, K=2, workers=args.workers, threads=args.threads,
+        checkpoint_dir=args.checkpoint_dir, resume=args.resume,
+        relaxed=relaxed, decomposed=decomposed, one_tree=args.one_tree,
+        sparse=args.sparse, inexact=args.inexact, store=args.store,
+        fixing=args.fixing, user_cuts=args.user_cuts,
+        symmetry_breaking=args.symmetry_breaking,
+        relax_and_cut=args.relax_and_cut,
+        **({
+            'step_rule': args.step_rule, 'stall_window': args.stall_window,
+            'pipeline': args.pipeline,
+        } if relaxed else {})
+    )
+    for idx, sol in solutions:
+        n = instances.index[idx]['n']
+        results.write({'type': 'instance', 'instance': idx, 'n': n, **sol})
+
+        sol_type = 'RELAXADA' if relaxed else 'EXATA'
+        print(f'\n{dash} SOLUÇÃO {sol_type} DO 2-TSP PARA N = {n} {dash}\n')
+
+        if relaxed:
+            # Imprimir limitantes da relaxação lagrangiana
+            print('Melhor limitante inferior encontrado:')
+            print_solution(2, sol['best_lb']['tours'], sol['best_lb']['cost'])
+            print('Melhor limitante superior encontrado:')
+            print_solution(2, sol['best_ub']['tours'], sol['best_ub']['cost'])
+
+        else:
+            # Imprimir solução ótima
+            print_solution(2, sol['opt']['tours'], sol['opt']['cost'])
+            print('Melhor limitante inferior encontrado:', sol['opt']['lb'])
 
-    print(f"Tempo de execução: {sol['runtime']}s")
+        print(f"Tempo de execução: {sol['runtime']}s")
+        sys.stdout.flush()
 
-sys.stdout.close()
+    results.close()
+    sys.stdout.close()
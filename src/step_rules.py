@@ -0,0 +1,219 @@
+'''
+Nesse módulo constam as regras de passo do método do subgradiente. Cada regra
+recebe, a cada iteração, o subgradiente e os limitantes correntes e retorna a
+direção e o tamanho do passo, mantendo o seu próprio estado (que é salvo nos
+checkpoints).
+'''
+import numpy as np
+
+class StepRule:
+    '''
+    Passo de Polyak, em que 'pi' multiplica a razão entre a distância ao
+    limitante superior e o quadrado da norma da direção, pi * (ub - lb) /
+    ||d||². Na regra base, a direção é o próprio subgradiente e 'pi' é
+    reduzido a cada iteração por um fator constante, até um valor mínimo.
+    Enquanto não há limitante superior, o passo mira 5% acima do melhor
+    limitante inferior.
+
+    Com 'project', as componentes do subgradiente que apontam para fora do
+    domínio dos multiplicadores (multiplicador no limite inferior e
+    subgradiente negativo) são anuladas. Elas não alteram os multiplicadores,
+    mas, com um multiplicador por aresta, dominam a norma e os produtos
+    internos do subgradiente.
+
+    Args:
+        pi: valor inicial de 'pi'.
+        decay: fator de redução de 'pi' a cada iteração.
+        min_pi: valor de 'pi' abaixo do qual não há redução.
+        project: booleano que indica se o subgradiente é projetado.
+    '''
+
+    def __init__(self, pi=2.0, decay=0.99, min_pi=0.1, project=False):
+        self.pi = pi
+        self.decay = decay
+        self.min_pi = min_pi
+        self.project = project
+
+    def direction(self, sg):
+        return sg
+
+    def target(self, lb, best_lb, best_ub):
+        # Sem solução viável, o alvo é uma estimativa 5% acima do melhor
+        # limitante inferior
+        if not np.isfinite(best_ub):
+            return best_lb + 0.05 * max(abs(best_lb), 1e-9)
+        return best_ub
+
+    def update(self, lb, best_lb, best_ub):
+        if self.pi > self.min_pi:
+            self.pi = self.decay * self.pi
+
+    def next(self, sg, lb, best_lb, best_ub, blocked=None):
+        '''
+        Calcula o passo da iteração corrente e atualiza o estado da regra.
+
+        Args:
+            sg: subgradiente na iteração.
+            lb: limitante inferior da iteração.
+            best_lb, best_ub: melhores limitantes inferior e superior.
+            blocked: vetor booleano que indica as componentes que apontam
+                para fora do domínio dos multiplicadores.
+
+        Returns:
+            Tupla com a direção e o tamanho do passo.
+        '''
+
+        if self.project and blocked is not None:
+            sg = np.where(blocked, 0.0, sg)
+        d = self.direction(sg)
+
+        # Direção nula: os multiplicadores correntes são ótimos para o dual
+        norm = d @ d
+        step = self.pi * (self.target(lb, best_lb, best_ub) - lb) / norm\
+            if norm > 0 else 0.0
+        self.update(lb, best_lb, best_ub)
+        return d, step
+
+    def export_state(self):
+        return {'pi': self.pi}
+
+    def load_state(self, state):
+        self.__dict__.update(state)
+
+class AdaptiveStep(StepRule):
+    '''
+    Passo de Polyak em que 'pi' é reduzido à metade sempre que o melhor
+    limitante inferior não melhora por 'patience' iterações consecutivas.
+
+    Args:
+        pi: valor inicial de 'pi'.
+        patience: nº de iterações sem melhora antes da redução.
+        factor: fator de redução de 'pi'.
+        min_pi: valor mínimo de 'pi'.
+    '''
+
+    def __init__(self, pi=2.0, patience=20, factor=0.5, min_pi=1e-4):
+        super().__init__(pi, factor, min_pi, project=True)
+        self.patience = patience
+        self.stalled = 0
+        self.reference = - np.inf
+
+    def update(self, lb, best_lb, best_ub):
+        if best_lb > self.reference:
+            self.reference = best_lb
+            self.stalled = 0
+            return
+
+        self.stalled += 1
+        if self.stalled >= self.patience:
+            self.pi = max(self.min_pi, self.decay * self.pi)
+            self.stalled = 0
+
+    def export_state(self):
+        return {
+            'pi': self.pi, 'stalled': self.stalled,
+            'reference': self.reference,
+        }
+
+class DeflectedStep(AdaptiveStep):
+    '''
+    Subgradiente defletido de Camerini, Fratta e Maffioli: a direção combina o
+    subgradiente com a direção anterior, d = sg + beta * d_ant, com
+    beta = max(0, - gamma * sg.d_ant / ||d_ant||²), o que amortece o
+    zigue-zague entre iterações. 'pi' é ajustado como em 'AdaptiveStep'.
+
+    Args:
+        gamma: fator de deflexão, tipicamente 1,5.
+        demais argumentos: ver 'AdaptiveStep'.
+    '''
+
+    def __init__(self, pi=2.0, patience=20, factor=0.5, min_pi=1e-4,
+                 gamma=1.5):
+        super().__init__(pi, patience, factor, min_pi)
+        self.gamma = gamma
+        self.previous = None
+
+    def direction(self, sg):
+        d = sg
+        # A direção anterior é estendida quando novos multiplicadores são
+        # criados (ver 'RelaxAndCutSubproblem')
+        if self.previous is not None and len(self.previous) < len(sg):
+            self.previous = np.concatenate(
+                (self.previous, np.zeros(len(sg) - len(self.previous)))
+            )
+        if self.previous is not None and self.previous.any():
+            beta = - self.gamma * (sg @ self.previous) /\
+                (self.previous @ self.previous)
+            if beta > 0:
+                d = sg + beta * self.previous
+        self.previous = d
+        return d
+
+    def export_state(self):
+        return dict(super().export_state(), previous=self.previous)
+
+class LevelStep(StepRule):
+    '''
+    Passo com valor-alvo (método de nível): em vez do limitante superior, o
+    passo de Polyak mira o nível best_lb + delta. Se o limitante inferior
+    avança ao menos delta / 2 desde a última revisão, o nível é mantido; se
+    não avança por 'patience' iterações, delta é reduzido à metade. Assim, a
+    regra não depende da qualidade do limitante superior.
+
+    Args:
+        ratio: fração da diferença entre os limitantes usada como delta
+            inicial.
+        patience: nº de iterações sem progresso antes da redução de delta.
+        pi: fator do passo.
+    '''
+
+    def __init__(self, ratio=0.5, patience=20, pi=1.0):
+        super().__init__(pi, 1.0, pi, project=True)
+        self.ratio = ratio
+        self.patience = patience
+        self.delta = None
+        self.reference = None
+        self.stalled = 0
+
+    def target(self, lb, best_lb, best_ub):
+        if self.delta is None:
+            gap = best_ub - best_lb if np.isfinite(best_ub) else abs(best_lb)
+            self.delta = max(self.ratio * gap, 1e-9)
+            self.reference = best_lb
+        return best_lb + self.delta
+
+    def update(self, lb, best_lb, best_ub):
+        if best_lb >= self.reference + self.delta / 2:
+            self.reference = best_lb
+            self.stalled = 0
+            return
+
+        self.stalled += 1
+        if self.stalled >= self.patience:
+            self.delta /= 2
+            self.reference = best_lb
+            self.stalled = 0
+
+    def export_state(self):
+        return {
+            'pi': self.pi, 'delta': self.delta, 'reference': self.reference,
+            'stalled': self.stalled,
+        }
+
+# Regras disponíveis pelo nome, usado na linha de comando
+STEP_RULES = {
+    'polyak': StepRule,
+    'adaptive': AdaptiveStep,
+    'deflected': DeflectedStep,
+    'level': LevelStep,
+}
+
+def make_step_rule(rule):
+    '''
+    Retorna uma regra de passo a partir do seu nome (ver 'STEP_RULES') ou a
+    própria regra, se já for uma instância.
+    '''
+
+    if isinstance(rule, str):
+        return STEP_RULES[rule]()
+    return rule
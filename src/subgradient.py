@@ -3,107 +3,428 @@ Nesse módulo consta a implementação do método do subgradiente para a resolu
 do problema dual lagrangiano relativo à relaxação lagrangiana do K-TSP.
 '''
 
-import gurobipy as gp
-from lagrangian_heuristic import lagrangian_heuristic
-from subtour_elimination import subtour_elimination
-from utils import build_tours_in_sol, shortest_cycle
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+import numpy as np
+from checkpoint import load_checkpoint, save_checkpoint
+from distance import as_distance_matrix
+from instrumentation import JsonlSink, PhaseTimer
+from lagrangian_heuristic import HeuristicCache, lagrangian_heuristic, repair_pool
+from local_search import local_search, neighbor_lists
+from step_rules import make_step_rule
 
-def subgradient(model, sgvars, dist):
+def heuristic_upper_bound(dist, tours, n, neighbors, timer, improve_ub=True,
+                          **heuristic_options):
+    '''
+    Limitante superior a partir dos tours do subproblema: heurística
+    lagrangiana seguida, opcionalmente, da busca local.
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        tours: Lista contendo k tours, possivelmente com arestas em comum.
+        n: nº de vértices.
+        neighbors: Lista de vizinhos mais próximos de cada vértice.
+        timer: 'PhaseTimer' que acumula o tempo de cada fase.
+        improve_ub: booleano que indica se os tours são melhorados por busca
+            local.
+        heuristic_options: demais argumentos da heurística lagrangiana.
+
+    Returns:
+        Tupla com o custo e a lista dos tours, ou '(inf, [])' se a heurística
+        não encontrar tours viáveis.
+    '''
+
+    with timer('heuristic'):
+        sol = lagrangian_heuristic(
+            dist, tours, n, neighbors=neighbors, **heuristic_options
+        )
+    if improve_ub and sol[1]:
+        with timer('local_search'):
+            sol = local_search(dist, sol[1], neighbors)
+    return sol
+
+# Argumentos fixos da heurística nos processos do pipeline
+_pipeline_args = None
+
+def _init_pipeline(dist, neighbors, improve_ub, heuristic_options):
+    global _pipeline_args
+    _pipeline_args = (dist, neighbors, improve_ub, heuristic_options)
+
+def _pipeline_task(tours, n, lower_bound):
+    dist, neighbors, improve_ub, heuristic_options = _pipeline_args
+    timer = PhaseTimer()
+    sol = heuristic_upper_bound(
+        dist, tours, n, neighbors, timer, improve_ub,
+        lower_bound=lower_bound, **heuristic_options
+    )
+    return sol, timer.times
+
+def subgradient(subproblem, dist, improve_ub=True, checkpoint=None,
+                checkpoint_every=10, resume=False, log=None,
+                max_iterations=None, observers=(), initial_ub=None,
+                step_rule='polyak', stall_window=None, min_improvement=1e-4,
+                min_step_norm=None, cache_size=128, cache_threshold=0.0,
+                heuristic_options=None, heuristic_workers=1, pipeline=0,
+                initial_multipliers=None, time_limit=1800.0):
     '''
     Método do subgradiente que visa encontrar os multiplicadores de lagrange
     que otimizam o limitante inferior retornado pela relaxação lagrangiana do 
     K-TSP.
 
     Args:
-        model: modelo do K-TSP.
-        sgvars: variável associada ao subgradiente.
-        dist: dicionário de custo das arestas (i,j), i >= j.
+        subproblem: subproblema lagrangiano (ver 'subproblems'), que define
+            os multiplicadores e retorna limitante, rotas e subgradiente.
+        dist: dicionário de custo das arestas (i,j), i >= j, ou 
+            'DistanceMatrix'.
+        improve_ub: booleano que indica se os tours da heurística lagrangiana
+            serão melhorados por busca local (2-opt e Or-opt).
+        checkpoint: caminho do arquivo em que o estado do método é salvo
+            periodicamente. Se 'None', não são salvos checkpoints.
+        checkpoint_every: nº de iterações entre dois checkpoints.
+        resume: booleano que indica se o método deve continuar a partir do
+            último checkpoint salvo em 'checkpoint', se houver.
+        log: caminho de um arquivo JSONL em que é escrito um registro por
+            iteração. Se 'None', as iterações não são registradas.
+        max_iterations: nº máximo de iterações. Se 'None', o método só para
+            pela otimalidade ou pelo limite de tempo.
+        observers: observadores (ver 'instrumentation.Observer') que recebem
+            o registro de cada iteração, com limitantes, passo, tempo de cada
+            fase e estatísticas do subproblema.
+        initial_ub: dicionário com custo 'cost' e rotas 'tours' de uma
+            solução viável (ver 'construction'), usada como limitante superior
+            inicial. Se 'None', o limitante inicial é infinito.
+        step_rule: regra de passo (ver 'step_rules'), pelo nome ou como
+            instância de 'StepRule'.
+        stall_window: nº de iterações da janela do critério de estagnação: o
+            método para se o melhor limitante inferior melhorar menos que
+            'min_improvement' (relativo) ao longo da janela. Se 'None', o
+            critério não é aplicado.
+        min_improvement: melhora relativa mínima do critério de estagnação.
+        min_step_norm: o método para se a norma do passo dado nos
+            multiplicadores for menor que esse valor. Se 'None', o critério
+            não é aplicado.
+        cache_size: nº máximo de soluções da heurística lagrangiana (seguida
+            da busca local) guardadas em cache, indexadas pelos tours do
+            subproblema (ver 'HeuristicCache').
+        cache_threshold: fração mínima das arestas dos tours do subproblema
+            que deve mudar para que a heurística seja executada novamente.
+        heuristic_options: dicionário de argumentos da heurística lagrangiana
+            (por exemplo, 'max_orderings' e 'randomize'), que limitam as k!
+            ordens de correção avaliadas quando k > 2.
+        heuristic_workers: nº de processos em que as ordens de correção são
+            avaliadas. Se 1, são avaliadas no próprio processo.
+        pipeline: nº máximo de execuções pendentes da heurística no modo
+            assíncrono. Se positivo, a heurística (seguida da busca local) dos
+            tours de cada iteração é executada em 'heuristic_workers'
+            processos enquanto o subproblema das iterações seguintes é
+            resolvido, e o passo usa o melhor limitante superior disponível
+            no momento. Com a fila cheia, ou enquanto não há limitante
+            superior finito, o método aguarda a execução mais antiga. Ao
+            final, as execuções pendentes são aguardadas no tempo restante;
+            as que excedem o limite continuam em segundo plano até
+            concluírem, e seus resultados são descartados. Se 0, a
+            heurística é executada em cada iteração, antes do passo.
+        initial_multipliers: dicionário com os multiplicadores iniciais 'u'
+            e, opcionalmente, o nome 'rule' e o estado 'step_rule' da regra de
+            passo que os obteve (como em 'multipliers' no retorno). O estado
+            só é recuperado se a regra for a mesma. Se 'None', os
+            multiplicadores iniciais são nulos. Ignorado ao retomar um
+            checkpoint.
+        time_limit: limite de tempo de relógio do método, em segundos.
 
     Returns:
         Dicionário da solução com melhores limitantes inferior e superior 
         ('best_lb' e 'best_ub') obtidos pelo método, assim como o tempo total
-        de execução 'runtime'.
+        de execução 'runtime' (tempo de relógio, que inclui a heurística), o
+        nº de iterações 'iterations', o critério de parada 'stop' e o
+        histórico 'trace' dos limitantes e passos de cada iteração, que
+        permite comparar as regras de passo. Em 'multipliers', constam os
+        multiplicadores 'u' do melhor limitante inferior e o nome 'rule' e
+        o estado 'step_rule' da regra de passo ao final.
     '''
 
-    pi = 2.0
+    rule = make_step_rule(step_rule)
+    trace = []
     runtime = 0.0
+    iteration = 0
+    best_lb = {'cost': - float('inf')}
     best_ub = {'cost': float('inf')}
+    if initial_ub is not None:
+        best_ub = initial_ub
 
-    # Recuperar alguns atributos salvos no modelo
-    n = model._n
-    K = model._K
-    xvars = model._xvars
+    n = subproblem.n
+    dist = as_distance_matrix(dist, n)
   
-    # Inicializar multiplicadores com 0 (um para cada aresta)
-    u = {(i,j): 0 for i in range(n) for j in range(i)}
-
-    # Função objetivo original
-    original_obj = gp.quicksum(
-        dist[i,j] * xvars[i,j,k] for i in range(n) 
-                                 for j in range(i) 
-                                 for k in range(K)
+    # Listas de vizinhos mais próximos usadas pela heurística e pela busca
+    # local
+    neighbors = neighbor_lists(dist, 10)
+
+    # Inicializar multiplicadores com 0, na ordem definida pelo subproblema,
+    # ou com os multiplicadores de uma execução anterior
+    u = np.zeros(len(subproblem.lower))
+    if initial_multipliers is not None:
+        u = np.maximum(subproblem.lower, initial_multipliers['u'])
+        if initial_multipliers.get('rule') == type(rule).__name__:
+            rule.load_state(initial_multipliers['step_rule'])
+    best_u = u
+
+    # Continuar a partir do último checkpoint, se houver
+    if resume and checkpoint is not None:
+        state = load_checkpoint(checkpoint)
+        if state is not None:
+            u = state['u']
+            best_u = state.get('best_u', u)
+            rule.load_state(state['step_rule'])
+            trace = state['trace']
+            runtime = state['runtime']
+            iteration = state['iteration']
+            best_lb = state['best_lb']
+            best_ub = state['best_ub']
+            subproblem.load_state(state['subproblem'])
+
+    def save_state():
+        save_checkpoint(checkpoint, {
+            'u': u,
+            'best_u': best_u,
+            'step_rule': rule.export_state(),
+            'trace': trace,
+            'runtime': runtime,
+            'iteration': iteration,
+            'best_lb': best_lb,
+            'best_ub': best_ub,
+            'subproblem': subproblem.export_state(),
+        })
+
+    # Registro de cada iteração, repassado aos observadores
+    observers = list(observers)
+    if log is not None:
+        observers.append(JsonlSink(log))
+    timer = PhaseTimer()
+    def notify(step):
+        record = {
+            'type': 'iteration', 'iteration': iteration, 'lb': lb,
+            'ub': ub['cost'], 'best_lb': best_lb['cost'],
+            'best_ub': best_ub['cost'], 'gap': opt_gap, 'pi': rule.pi,
+            'step': step, 'runtime': runtime,
+        }
+        trace.append({
+            'iteration': iteration, 'lb': lb, 'best_lb': best_lb['cost'],
+            'best_ub': best_ub['cost'], 'step_norm': step_norm,
+            'runtime': runtime,
+        })
+        record.update(subproblem.stats())
+        record.update(heuristic.stats())
+        if pipeline > 0:
+            record['pending'] = len(pending)
+        record.update({'time_' + k: v for k, v in timer.times.items()})
+        for observer in observers:
+            observer.on_iteration(record)
+
+    # Heurística lagrangiana seguida da busca local, determinística nos tours
+    # do subproblema. No modo pipeline, cada processo avalia as ordens de
+    # correção em sequência
+    heuristic_options = dict(heuristic_options or {})
+    executor = None
+    if pipeline > 0:
+        executor = ProcessPoolExecutor(
+            max_workers=heuristic_workers, initializer=_init_pipeline,
+            initargs=(dist, neighbors, improve_ub, heuristic_options)
+        )
+    elif heuristic_workers > 1:
+        executor = repair_pool(dist, heuristic_workers, neighbors)
+    def upper_bound(dist, tours, n):
+        return heuristic_upper_bound(
+            dist, tours, n, neighbors, timer, improve_ub, executor=executor,
+            lower_bound=best_lb['cost'], **heuristic_options
+        )
+    heuristic = HeuristicCache(
+        upper_bound, maxsize=cache_size, threshold=cache_threshold
     )
 
+    # Execuções pendentes da heurística no modo pipeline, indexadas pela
+    # chave dos tours no cache, em ordem de submissão
+    pending = OrderedDict()
+    def collect(block=0):
+        # Soluções das execuções concluídas; as 'block' mais antigas são
+        # aguardadas
+        sols = []
+        for idx, (key, future) in enumerate(list(pending.items())):
+            if idx >= block and not future.done():
+                continue
+            with timer('heuristic_wait'):
+                sol, times = future.result()
+            for phase, elapsed in times.items():
+                timer.times[phase] = timer.times.get(phase, 0.0) + elapsed
+            del pending[key]
+            sols.append(heuristic.store(key, sol))
+        return sols
+
+    # Melhora relativa do melhor limitante inferior ao longo da janela
+    def stalled():
+        if stall_window is None or len(trace) < stall_window:
+            return False
+        old = trace[-stall_window]['best_lb']
+        return best_lb['cost'] - old < min_improvement * max(1.0, abs(old))
+
+    # O tempo de execução inclui a heurística e a atualização dos
+    # multiplicadores, que dominam as iterações de subproblemas rápidos
+    start = time.perf_counter() - runtime
+
     while True:
 
-        # Tempo restante
-        model.Params.timeLimit = 1800.0 - runtime
+        # Orçamento de tempo ou de iterações esgotado (possível ao retomar um
+        # checkpoint, inclusive com um limite de iterações menor)
+        runtime = time.perf_counter() - start
+        if runtime >= time_limit:
+            stop = 'time'
+            break
+        if max_iterations is not None and iteration >= max_iterations:
+            stop = 'iterations'
+            break
+
+        iteration += 1
+        timer.reset()
 
-        # Penalidades correspondentes às restrições dualizadas
-        obj_penalty = gp.quicksum(
-            u[i,j] * sgvars[i,j] for i in range(n) for j in range(i)
-        )
+        # Resolver o subproblema no tempo restante
+        sol = subproblem.solve(u, time_limit - runtime, timer)
+        lb, tours = sol['lb'], sol['tours']
+
+        # No relax-and-cut, o subgradiente inclui as restrições ativadas
+        # nesta iteração, cujos multiplicadores começam nulos
+        if len(sol['sg']) > len(u):
+            u = np.concatenate((u, np.zeros(len(sol['sg']) - len(u))))
+
+        # Atualizar melhor limitante inferior, se necessário
+        if lb > best_lb['cost']:
+            best_lb = {'cost': lb, 'tours': tours}
+            best_u = u
 
-        # Penalizar função objetivo e re-otimizar
-        model.setObjective(original_obj + obj_penalty)
-        model.optimize(subtour_elimination)
-        runtime += model.Runtime
+        # Executar heurística lagrangiana para obter um limitante superior. Em
+        # iterações estagnadas, os tours se repetem e a solução vem do cache
+        if pipeline > 0:
 
-        # Recuperar solução
-        x_sol = model.getAttr('x', xvars)
-        tours = build_tours_in_sol(K, n, x_sol, xvars.keys())
+            # Os tours desta iteração entram na fila e o limitante superior
+            # recebe as soluções já concluídas
+            key = heuristic.key(tours)
+            sols = collect()
+            cached = heuristic.lookup(key) if key not in pending else None
+            if cached is not None:
+                sols.append(cached)
+            elif key not in pending:
+                if len(pending) >= pipeline:
+                    sols += collect(block=1)
+                pending[key] = executor.submit(
+                    _pipeline_task, tours, n, best_lb['cost']
+                )
 
-        # Executar heurística lagrangiana para obter um limitante superior
-        heuristic_sol = lagrangian_heuristic(dist, tours, n)
+            # Enquanto não há solução viável, as execuções pendentes são
+            # aguardadas, a partir da mais antiga, até que uma delas produza
+            # uma solução viável, o que dá ao passo um limitante superior
+            while pending and not np.isfinite(
+                min([best_ub['cost']] + [sol[0] for sol in sols])
+            ):
+                sols += collect(block=1)
+
+            # Sem execução concluída nesta iteração, não há novo limitante
+            # superior, como quando a heurística não encontra tours viáveis
+            heuristic_sol = min(sols, key=lambda sol: sol[0])\
+                if sols else (float('inf'), [])
+        else:
+            heuristic_sol = heuristic(dist, tours, n)
         ub = {'cost': heuristic_sol[0], 'tours': heuristic_sol[1]}
 
         # Atualizar melhor limitante superior, se necessário
         if ub['cost'] < best_ub['cost']:
             best_ub = ub
 
+        # Precisão das próximas resoluções do subproblema
+        subproblem.update_accuracy(best_lb['cost'], best_ub['cost'])
+
         # CRITÉRIOS DE PARADA:
         # - Optimalidade
         # - Limite de tempo
-        opt_gap = (best_ub['cost'] - model.objVal) / best_ub['cost']
-        if opt_gap < 10e-6 or runtime >= 1800.0:
+        # - Limite de iterações
+        # - Estagnação do limitante inferior
+        runtime = time.perf_counter() - start
+        opt_gap = (best_ub['cost'] - best_lb['cost']) / best_ub['cost']
+        stop = 'optimal' if opt_gap < 10e-6 else\
+            'time' if runtime >= time_limit else\
+            'iterations' if max_iterations is not None and\
+                iteration >= max_iterations else\
+            'stalled' if stalled() else None
+        if stop is not None:
+            step_norm = None
+            notify(None)
             break
 
-        # Recuperar subgradiente
-        sg_sol = model.getAttr('x', sgvars)
+        with timer('update'):
 
-        # Denominador do passo é a soma dos quadrados dos valores do
-        # subgradiente
-        square_subgrad_sum = sum(
-            [sg_sol[i,j]**2 for i in range(n) for j in range(i)]
-        )
+            # Atualizar multiplicadores, dando um passo na direção indicada
+            # pela regra (o subgradiente ou uma combinação dele com a
+            # direção anterior) com o intuito de maximizar o limitante
+            # inferior retornado pela relaxação
+            direction, step = rule.next(
+                sol['sg'], lb, best_lb['cost'], best_ub['cost'],
+                blocked=(u <= subproblem.lower) & (sol['sg'] < 0)
+            )
+            # Um passo não finito (limitantes inválidos) corromperia os
+            # multiplicadores e o modelo do subproblema
+            if not np.isfinite(step):
+                raise RuntimeError(
+                    f'Passo não finito na iteração {iteration}: '
+                    f"lb={lb}, best_ub={best_ub['cost']}"
+                )
+            new_u = np.maximum(subproblem.lower, u + step * direction)
+            step_norm = float(np.linalg.norm(new_u - u))
+            u = new_u
 
-        # Atualizar multiplicadores, dando um passo em direção ao 
-        # subgradiente com o intuito de maximizar o limitante inferior
-        # retornado pela relaxação
-        step = pi * (best_ub['cost'] - model.objVal) / square_subgrad_sum
-        u = {
-            (i,j): max(0.0, u[i,j] + step * sg_sol[i,j]) 
-            for i in range(n) for j in range(i)
-        }
+        notify(step)
 
-        # Atualiza o valor de pi
-        if pi > 0.1:
-            pi = 0.99 * pi
+        # - Passo nulo
+        if min_step_norm is not None and step_norm < min_step_norm:
+            stop = 'step'
+            break
 
-    # Retornar dicionário com melhores limitantes encontrados e tempo de
-    # execução total do método
-    return {
-        'best_lb': {'cost': model.objVal, 'tours': tours},
+        if checkpoint is not None and iteration % checkpoint_every == 0:
+            save_state()
+
+    # Aguardar as execuções pendentes da heurística no tempo restante
+    if pending:
+        wait(list(pending.values()), timeout=max(0.0, time_limit - runtime))
+        for sol in collect():
+            if sol[0] < best_ub['cost']:
+                best_ub = {'cost': sol[0], 'tours': sol[1]}
+        runtime = time.perf_counter() - start
+
+    if checkpoint is not None:
+        save_state()
+    # As execuções ainda na fila são canceladas (o argumento
+    # 'cancel_futures' de 'shutdown' requer Python 3.9). As que já estão em
+    # andamento, no máximo uma por processo, não podem ser interrompidas pela
+    # API pública do 'ProcessPoolExecutor': o método retorna sem aguardá-las,
+    # e os processos terminam ao concluí-las, concorrendo pela CPU com a
+    # instância seguinte durante esse tempo
+    if executor is not None:
+        for future in pending.values():
+            future.cancel()
+        executor.shutdown(wait=not pending)
+
+    # Retornar dicionário com melhores limitantes encontrados, tempo de
+    # execução total e nº de iterações do método
+    result = {
+        'best_lb': best_lb,
         'best_ub': best_ub,
         'runtime': runtime,
+        'iterations': iteration,
+        'stop': stop,
+        'trace': trace,
+        'multipliers': {
+            'u': best_u, 'rule': type(rule).__name__,
+            'step_rule': rule.export_state(),
+        },
     }
+    for observer in observers:
+        observer.on_finish(result)
+
+    return result
@@ -0,0 +1,461 @@
+'''
+Nesse módulo constam os subproblemas lagrangianos do K-TSP resolvidos a cada
+iteração do método do subgradiente. Todos recebem o vetor de multiplicadores e
+retornam o limitante inferior, as rotas da solução e o subgradiente.
+'''
+import time
+import numpy as np
+from gurobipy import GRB
+from cut_pool import CutPool
+from one_tree import min_one_tree, one_tree_tour, penalized_matrix
+from subtour_elimination import subtour_elimination
+from utils import build_tours_in_sol
+
+# 'MIPGap' das resoluções exatas do subproblema, menor que a tolerância do
+# critério de otimalidade do método do subgradiente (ver 'subgradient')
+EXACT_GAP = 1e-6
+
+class AccuracySchedule:
+    '''
+    Cronograma de precisão do subproblema MIP: as primeiras iterações, com
+    multiplicadores ainda distantes do ótimo, são resolvidas com um 'MIPGap'
+    grande (e, opcionalmente, limites de tempo e de nós), já que o limitante
+    lagrangiano é o 'ObjBound' do MIP, válido mesmo sem otimalidade. O 'MIPGap' é reduzido para uma fração 'factor' da diferença
+    relativa entre os limitantes e à metade sempre que o limitante inferior
+    estagna por 'patience' iterações. Ao atingir 'final_gap', os limites são
+    removidos e as resoluções voltam a ser exatas.
+
+    Args:
+        initial_gap: 'MIPGap' inicial.
+        final_gap: 'MIPGap' das resoluções exatas.
+        factor: fração da diferença relativa entre os limitantes usada como
+            'MIPGap'.
+        patience: nº de iterações sem melhora do limitante inferior antes de
+            reduzir o 'MIPGap' à metade.
+        time_cap: limite de tempo de cada resolução inexata. Se 'None', não
+            há limite além do tempo restante.
+        node_cap: limite de nós de cada resolução inexata. Se 'None', não há
+            limite.
+    '''
+
+    def __init__(self, initial_gap=0.05, final_gap=EXACT_GAP, factor=0.5,
+                 patience=5, time_cap=None, node_cap=None):
+        self.gap = initial_gap
+        self.final_gap = final_gap
+        self.factor = factor
+        self.patience = patience
+        self.time_cap = time_cap
+        self.node_cap = node_cap
+        self.reference = - np.inf
+        self.stalled = 0
+
+    @property
+    def exact(self):
+        return self.gap <= self.final_gap
+
+    def update(self, best_lb, best_ub):
+        '''
+        Ajusta a precisão de acordo com os melhores limitantes.
+        '''
+
+        if np.isfinite(best_ub) and best_ub > 0:
+            self.gap = min(self.gap, self.factor * (best_ub - best_lb) / best_ub)
+
+        if best_lb > self.reference:
+            self.reference = best_lb
+            self.stalled = 0
+        else:
+            self.stalled += 1
+            if self.stalled >= self.patience:
+                self.gap /= 2
+                self.stalled = 0
+
+        self.gap = max(self.gap, self.final_gap)
+
+    def params(self):
+        '''
+        Parâmetros do Gurobi da próxima resolução.
+        '''
+
+        if self.exact:
+            return {'MIPGap': self.final_gap}
+
+        params = {'MIPGap': self.gap}
+        if self.time_cap is not None:
+            params['TimeLimit'] = self.time_cap
+        if self.node_cap is not None:
+            params['NodeLimit'] = self.node_cap
+        return params
+
+    def export_state(self):
+        return {
+            'gap': self.gap, 'reference': self.reference,
+            'stalled': self.stalled,
+        }
+
+    def load_state(self, state):
+        self.__dict__.update(state)
+
+class MIPSubproblem:
+    '''
+    Subproblema resolvido pelo Gurobi, com as restrições de disjunção
+    dualizadas (um multiplicador não-negativo por aresta). Pode ser o modelo
+    completo do K-TSP relaxado ou o subproblema decomposto, em que um único
+    TSP com custos penalizados é resolvido e sua rota é replicada para os
+    'model._copies' caixeiros.
+
+    Args:
+        model: modelo do K-TSP.
+        sgvars: variável associada ao subgradiente. Se 'None', o modelo é o
+            subproblema decomposto.
+        max_cut_age: nº de iterações consecutivas com folga após as quais um
+            corte de eliminação de subciclo é descartado do pool.
+        schedule: 'AccuracySchedule' que define a precisão de cada
+            resolução. Se 'None', todas as resoluções são exatas (com
+            'MIPGap' igual a 'EXACT_GAP').
+
+    O limitante lagrangiano é sempre o 'ObjBound' do MIP, que não excede o
+    ótimo do subproblema mesmo quando a resolução para dentro da tolerância
+    do 'MIPGap'; as rotas e o subgradiente vêm da melhor solução encontrada.
+    '''
+
+    def __init__(self, model, sgvars, max_cut_age=5, schedule=None):
+        self.model = model
+        self.decomposed = sgvars is None
+        if not self.decomposed:
+            self.sglist = list(sgvars.values())
+
+        # Cortes encontrados pela callback são preservados entre as iterações
+        self.cut_pool = CutPool(max_age=max_cut_age)
+        model._cut_pool = self.cut_pool
+
+        self.schedule = schedule
+
+        self.n = model._n
+        self.K = model._copies
+        # Limite inferior de cada multiplicador
+        self.lower = np.zeros(len(model._cost))
+
+    def solve(self, u, time_limit, timer):
+        '''
+        Resolve o subproblema para os multiplicadores 'u'.
+
+        Args:
+            u: vetor de multiplicadores.
+            time_limit: tempo máximo de resolução.
+            timer: 'PhaseTimer' que mede as fases da resolução.
+
+        Returns:
+            Dicionário com o limitante inferior 'lb', as rotas 'tours', o
+            subgradiente 'sg' e o tempo de resolução 'runtime'.
+        '''
+
+        model = self.model
+        model._cb_stats = {'calls': 0, 'cuts': 0, 'user_cuts': 0, 'time': 0.0}
+
+        # Precisão da resolução, limitada pelo tempo restante
+        params = self.schedule.params() if self.schedule is not None else {}
+        model.Params.MIPGap = params.get('MIPGap', EXACT_GAP)
+        model.Params.NodeLimit = params.get('NodeLimit', GRB.INFINITY)
+        model.Params.timeLimit = min(time_limit, params.get('TimeLimit', time_limit))
+
+        with timer('objective'):
+            self.set_objective(u)
+
+        # Re-otimizar
+        with timer('optimize'):
+            self.cut_pool.inject(model)
+            model.optimize(subtour_elimination)
+
+            # Sem solução viável dentro dos limites da resolução inexata, a
+            # otimização continua sem eles
+            if model.SolCount == 0 and model.Status != GRB.INFEASIBLE:
+                model.Params.NodeLimit = GRB.INFINITY
+                model.Params.timeLimit = max(0.0, time_limit - model.Runtime)
+                model.optimize(subtour_elimination)
+
+            self.cut_pool.age(model)
+
+        # Sem solução, não há rotas nem subgradiente para o passo
+        if model.SolCount == 0:
+            raise RuntimeError(
+                'Subproblema lagrangiano sem solução viável '
+                f'(status {model.Status}, limite de tempo {time_limit:.1f}s)'
+            )
+
+        # Recuperar solução
+        with timer('build_tours'):
+            x_sol = np.array(model.getAttr('x', model._xlist))
+            x_sol = x_sol.reshape(model._K, -1)
+            tours = build_tours_in_sol(model._K, self.n, x_sol, model._edges)
+
+        # Limitante inferior pelo 'ObjBound' do MIP, que não excede o ótimo
+        # do subproblema (o 'objVal' pode excedê-lo dentro da tolerância do
+        # 'MIPGap', o que seria multiplicado por K no subproblema decomposto)
+        lb, tours, sg = self.dual_bound(model.ObjBound, u, x_sol, tours)
+
+        return {'lb': lb, 'tours': tours, 'sg': sg, 'runtime': model.Runtime}
+
+    def set_objective(self, u):
+        '''
+        Penalidades correspondentes às restrições dualizadas, atualizadas
+        diretamente nos coeficientes da função objetivo. No subproblema
+        decomposto, a aresta tem custo penalizado 'dist + u' e a parcela
+        constante '- sum(u)' é descontada fora do modelo.
+        '''
+
+        model = self.model
+        if self.decomposed:
+            model.setAttr('Obj', model._xlist, (model._cost + u).tolist())
+        else:
+            model.setAttr('Obj', self.sglist, u.tolist())
+
+    def dual_bound(self, value, u, x_sol, tours):
+        '''
+        Limitante inferior e subgradiente a partir do valor do modelo e da
+        solução (K x nº de arestas). No subproblema decomposto, a rota é
+        replicada para cada um dos caixeiros.
+
+        Returns:
+            Tupla com o limitante, as rotas e o subgradiente.
+        '''
+
+        if self.decomposed:
+            lb = self.K * value - float(u.sum())
+            tours = [list(tours[0]) for _ in range(self.K)]
+            sg = self.K * x_sol[0] - 1
+        else:
+            lb = value
+            sg = np.array(self.model.getAttr('x', self.sglist))
+        return lb, tours, sg
+
+    def stats(self):
+        '''
+        Estatísticas da última resolução: nós explorados, chamadas da
+        callback, cortes adicionados e tamanho do pool de cortes.
+        '''
+
+        return {
+            'node_count': self.model.NodeCount,
+            'callback_calls': self.model._cb_stats['calls'],
+            'callback_cuts': self.model._cb_stats['cuts'],
+            'callback_user_cuts': self.model._cb_stats['user_cuts'],
+            'callback_time': self.model._cb_stats['time'],
+            'pool_size': len(self.cut_pool),
+            'mip_gap': self.model.Params.MIPGap,
+        }
+
+    def update_accuracy(self, best_lb, best_ub):
+        if self.schedule is not None:
+            self.schedule.update(best_lb, best_ub)
+
+    def export_state(self):
+        state = {'cuts': self.cut_pool.export()}
+        if self.schedule is not None:
+            state['schedule'] = self.schedule.export_state()
+        return state
+
+    def load_state(self, state):
+        self.cut_pool.load(state['cuts'])
+        if self.schedule is not None and 'schedule' in state:
+            self.schedule.load_state(state['schedule'])
+
+class RelaxAndCutSubproblem(MIPSubproblem):
+    '''
+    Relax-and-cut: as restrições de disjunção são dualizadas sob demanda. O
+    modelo (completo ou decomposto) não contém as restrições nem as variáveis
+    do subgradiente, e apenas as restrições ativas são penalizadas. Uma
+    restrição é ativada quando a solução do subproblema usa a aresta em mais
+    de uma rota, e desativada quando permanece folgada, com multiplicador
+    nulo, por 'max_age' iterações consecutivas (até ser violada novamente).
+
+    Os multiplicadores formam um mapa esparso: cada aresta já ativada ocupa
+    uma posição do vetor de multiplicadores ('slots'), que cresce à medida que
+    novas arestas são violadas. Assim, o tamanho do modelo e o trabalho de
+    cada iteração dependem do nº de arestas em conflito, e não de n².
+
+    Args:
+        model: modelo do K-TSP, sem as restrições de disjunção.
+        max_age: nº de iterações consecutivas com folga e multiplicador nulo
+            após as quais uma restrição é desativada.
+        max_cut_age: ver 'MIPSubproblem'.
+        schedule: ver 'MIPSubproblem'.
+    '''
+
+    def __init__(self, model, max_age=5, max_cut_age=5, schedule=None):
+        super().__init__(model, None, max_cut_age, schedule)
+        self.max_age = max_age
+
+        # Aresta (posição no modelo) de cada multiplicador e posição do
+        # multiplicador de cada aresta
+        self.keys = np.empty(0, dtype=np.int64)
+        self.slots = {}
+        self.active = np.empty(0, dtype=bool)
+        self.idle = np.empty(0, dtype=np.int64)
+        self.lower = np.zeros(0)
+
+        # Arestas penalizadas na função objetivo e suas penalidades
+        self.penalized = np.empty(0, dtype=np.int64)
+
+    def set_objective(self, u):
+        '''
+        Atualiza apenas os coeficientes das arestas penalizadas na iteração
+        anterior ou na atual, em todas as rotas do modelo.
+        '''
+
+        model = self.model
+        m = len(model._cost)
+        edges = self.keys[self.active]
+        changed = np.union1d(self.penalized, edges)
+
+        penalty = np.zeros(m)
+        penalty[edges] = u[:len(self.keys)][self.active]
+        obj = model._cost[changed] + penalty[changed]
+
+        idx = (np.arange(model._K)[:, None] * m + changed).ravel()
+        model.setAttr(
+            'Obj', [model._xlist[i] for i in idx],
+            np.tile(obj, model._K).tolist()
+        )
+        self.penalized = edges
+
+    def dual_bound(self, value, u, x_sol, tours):
+        '''
+        Limitante inferior e subgradiente das restrições ativas, que são
+        atualizadas: as violadas são ativadas e as folgadas por 'max_age'
+        iterações, desativadas. O subgradiente inclui as posições das arestas
+        ativadas pela primeira vez, cujos multiplicadores começam nulos.
+        '''
+
+        # Nº de rotas que usam cada aresta. No subproblema decomposto, a rota
+        # é replicada para cada um dos caixeiros
+        copies = self.K // self.model._K
+        load = copies * x_sol.sum(axis=0)
+        if copies > 1:
+            tours = [list(tours[0]) for _ in range(self.K)]
+
+        u = u[:len(self.keys)]
+        lb = copies * value - float(u[self.active].sum())
+        sg = np.where(self.active, load[self.keys] - 1, 0.0)
+
+        # Desativar restrições folgadas com multiplicador nulo
+        slack = self.active & (u <= 0) & (sg <= 0)
+        self.idle = np.where(slack, self.idle + 1, 0)
+        self.active &= self.idle < self.max_age
+
+        # Ativar as restrições violadas, com novas posições para as arestas
+        # ainda sem multiplicador
+        violated = np.flatnonzero(load > 1.5)
+        new = [e for e in violated.tolist() if e not in self.slots]
+        for e in new:
+            self.slots[e] = len(self.slots)
+        known = [self.slots[e] for e in violated.tolist()]
+        self.keys = np.concatenate((self.keys, np.array(new, dtype=np.int64)))
+        self.active = np.concatenate((self.active, np.ones(len(new), bool)))
+        self.idle = np.concatenate((self.idle, np.zeros(len(new), np.int64)))
+        self.active[known] = True
+        self.idle[known] = 0
+        self.lower = np.zeros(len(self.keys))
+
+        sg = np.concatenate((sg, load[new] - 1))
+        sg[known] = load[self.keys[known]] - 1
+        return lb, tours, sg
+
+    def stats(self):
+        return dict(
+            super().stats(), active_constraints=int(self.active.sum()),
+            multipliers=len(self.keys),
+        )
+
+    def export_state(self):
+        return dict(
+            super().export_state(), keys=self.keys, active=self.active,
+            idle=self.idle,
+        )
+
+    def load_state(self, state):
+        super().load_state(state)
+        self.keys = state['keys']
+        self.active = state['active']
+        self.idle = state['idle']
+        self.slots = {int(e): slot for slot, e in enumerate(self.keys)}
+        self.lower = np.zeros(len(self.keys))
+        self.penalized = np.arange(len(self.model._cost))
+
+class OneTreeSubproblem:
+    '''
+    Relaxação de Held-Karp do K-TSP, que dispensa o MIP: além das restrições
+    de disjunção (um multiplicador não-negativo 'u' por aresta), as restrições
+    de grau 2 são dualizadas (um multiplicador livre 'pi' por vértice, comum às
+    K rotas). Cada rota é então relaxada em uma 1-árvore mínima com custos
+    'dist + u + pi_i + pi_j', idêntica para os K caixeiros, e o limitante é
+    K * custo da 1-árvore - sum(u) - 2K * sum(pi).
+
+    O vetor de multiplicadores é a concatenação de 'u' (arestas, na ordem dos
+    identificadores fixos) e 'pi' (vértices).
+
+    Args:
+        dist: 'DistanceMatrix' da instância.
+        K: nº de caixeiros viajantes.
+        edges: tupla de vetores com os vértices i e j de cada aresta.
+    '''
+
+    def __init__(self, dist, K, edges):
+        self.n = dist.n
+        self.K = K
+        self.edges = edges
+        self.cost = np.array(dist.vector)
+        self.m = len(self.cost)
+        self.lower = np.concatenate((np.zeros(self.m), np.full(self.n, -np.inf)))
+
+    def solve(self, u, time_limit, timer):
+        '''
+        Resolve o subproblema para os multiplicadores 'u' (ver
+        'MIPSubproblem.solve'). O limite de tempo é ignorado, pois uma
+        resolução leva uma fração de segundo.
+        '''
+
+        start = time.perf_counter()
+        n, K = self.n, self.K
+        u_edges, pi = u[:self.m], u[self.m:]
+        ei, ej = self.edges
+
+        with timer('objective'):
+            C = penalized_matrix(
+                n, self.edges, self.cost + u_edges + pi[ei] + pi[ej]
+            )
+
+        with timer('optimize'):
+            tree_cost, ti, tj = min_one_tree(C)
+
+        with timer('build_tours'):
+            tour = one_tree_tour(n, ti, tj)
+
+        lb = K * tree_cost - float(u_edges.sum()) - 2 * K * float(pi.sum())
+
+        # Subgradiente: K * x_e - 1 p/ cada aresta e K * (grau - 2) p/ cada
+        # vértice
+        hi, lo = np.maximum(ti, tj), np.minimum(ti, tj)
+        x = np.zeros(self.m)
+        x[hi * (hi - 1) // 2 + lo] = 1.0
+        degree = np.bincount(np.concatenate((ti, tj)), minlength=n)
+        sg = np.concatenate((K * x - 1, K * (degree - 2.0)))
+
+        return {
+            'lb': lb,
+            'tours': [list(tour) for _ in range(K)],
+            'sg': sg,
+            'runtime': time.perf_counter() - start,
+        }
+
+    def stats(self):
+        return {}
+
+    def update_accuracy(self, best_lb, best_ub):
+        pass
+
+    def export_state(self):
+        return {}
+
+    def load_state(self, state):
+        pass
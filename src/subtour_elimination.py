@@ -2,17 +2,72 @@
 Nesse módulo consta a implementação da callback que adiciona dinamicamente 
 cortes relativos às restrições de eliminação de subciclo ao modelo do K-TSP.
 '''
-from itertools import combinations
-from tqdm import tqdm
+import time
+import numpy as np
 import gurobipy as gp
 from gurobipy import GRB
-from utils import get_edges_in_tour, shortest_cycle
+from separation import fractional_subtours, solution_cycles
+
+def user_cut_options(min_violation=0.1, max_cuts=10, root_rounds=20,
+                     node_rounds=1):
+    '''
+    Opções da separação de cortes de eliminação de subciclo nas soluções
+    fracionárias dos nós da árvore de branch-and-bound (ver
+    'subtour_elimination'), a serem atribuídas a 'model._user_cuts'. O modelo
+    deve ter o parâmetro 'PreCrush' igual a 1.
+
+    Args:
+        min_violation: violação mínima de um corte.
+        max_cuts: nº máximo de cortes por rota em cada rodada de separação.
+        root_rounds: nº máximo de rodadas de separação no nó raiz.
+        node_rounds: nº máximo de rodadas de separação nos demais nós.
+
+    Returns:
+        Dicionário de opções, que também guarda o nó corrente e o nº de
+        rodadas já executadas nele.
+    '''
+
+    return {
+        'min_violation': min_violation, 'max_cuts': max_cuts,
+        'root_rounds': root_rounds, 'node_rounds': node_rounds,
+        'node': None, 'rounds': 0, 'runtime': 0.0,
+    }
+
+def subtour_expr(model, vertices, t):
+    '''
+    Função que monta o lado esquerdo da restrição de eliminação de subciclo
+    de um conjunto de vértices: a soma das variáveis da rota t cujas arestas
+    têm ambas as extremidades no conjunto. Apenas as arestas presentes no
+    modelo (que pode ser esparso) são consideradas.
+
+    Args:
+        model: modelo do K-TSP.
+        vertices: lista de vértices do conjunto.
+        t: rota.
+
+    Returns:
+        Expressão linear do Gurobi.
+    '''
+
+    ei, ej = model._edges
+    inside = np.zeros(model._n, dtype=bool)
+    inside[vertices] = True
+    offset = t * len(ei)
+    idx = np.flatnonzero(inside[ei] & inside[ej]) + offset
+    return gp.LinExpr([1.0] * len(idx), [model._xlist[e] for e in idx])
 
 def subtour_elimination(model, where):
     '''
     Callback que, para uma solução ótima do K-TSP relaxado, verifica se essa
     solução viola restrições de eliminação de subciclo e, se sim, adiciona
-    essas restrições ao modelo, que será re-otimizado.
+    essas restrições ao modelo, que será re-otimizado. Uma restrição é 
+    adicionada para cada subciclo de cada rota.
+
+    Se 'model._user_cuts' contiver opções de separação (ver
+    'user_cut_options'), as soluções fracionárias dos nós da árvore também
+    são separadas, por corte mínimo (ver 'separation.fractional_subtours'), e
+    as restrições violadas são adicionadas como cortes de usuário, o que
+    fortalece o limitante de cada nó.
 
     Args:
         model: o modelo associado a callback.
@@ -20,24 +75,75 @@ def subtour_elimination(model, where):
     '''
 
     if where == GRB.Callback.MIPSOL:
+        start = time.perf_counter()
+        cuts = 0
+
+        # Recuperar a solução uma única vez, como vetor (K x nº de arestas)
+        x_sol = np.array(model.cbGetSolution(model._xlist))
+        x_sol = x_sol.reshape(model._K, -1)
+
         # Analisar cada rota t
-        for t in range(model._K):
+        for t, cycles in enumerate(
+                solution_cycles(model._K, model._n, x_sol, model._edges)):
+
+            # Se a rota não percorre todos os vértices em um único ciclo, cada
+            # um dos seus subciclos viola uma restrição
+            if len(cycles) == 1:
+                continue
+
+            for cycle in cycles:
 
-            # Criar lista de arestas na rota t selecionadas na solução
-            x_sol = model.cbGetSolution(model._xvars)
-            edges_in_tour = get_edges_in_tour(t, x_sol, model._xvars.keys())
+                # Adicionar restrição de eliminação de subciclo, com as arestas
+                # entre pares de vértices do subciclo encontrado
+                model.cbLazy(subtour_expr(model, cycle, t) <= len(cycle)-1)
 
-            # Encontrar menor ciclo e verificar se viola restrição, i.e., se
-            # não percorre todos os vértices, formando um subciclo
-            cycle = shortest_cycle(model._n, edges_in_tour)
-            if len(cycle) < model._n:
+                # Registrar o corte no pool, se houver, para que seja 
+                # reaproveitado nas próximas otimizações
+                if model._cut_pool is not None:
+                    model._cut_pool.add(cycle, t)
+                cuts += 1
 
-                # Adicionar restrições de eliminação de subciclo, para cada par 
-                # de vértices do subciclo encontrado
-                model.cbLazy(
-                    gp.quicksum(
-                        model._xvars[i, j, t]
-                        for i, j in combinations(cycle, 2)
-                    ) <= len(cycle)-1
-                )
+        # Estatísticas da callback, se estiverem sendo coletadas
+        if model._cb_stats is not None:
+            model._cb_stats['calls'] += 1
+            model._cb_stats['cuts'] += cuts
+            model._cb_stats['time'] += time.perf_counter() - start
+
+    elif where == GRB.Callback.MIPNODE and model._user_cuts is not None:
+
+        # Apenas nós com relaxação linear resolvida, e no máximo o nº de
+        # rodadas de separação permitido por nó
+        if model.cbGet(GRB.Callback.MIPNODE_STATUS) != GRB.OPTIMAL:
+            return
+        # Um novo nó, ou uma nova otimização (o tempo de execução recomeça),
+        # reinicia a contagem de rodadas
+        options = model._user_cuts
+        node = model.cbGet(GRB.Callback.MIPNODE_NODCNT)
+        runtime = model.cbGet(GRB.Callback.RUNTIME)
+        if node != options['node'] or runtime < options['runtime']:
+            options['node'], options['rounds'] = node, 0
+        options['runtime'] = runtime
+        limit = options['root_rounds'] if node == 0 else options['node_rounds']
+        if options['rounds'] >= limit:
+            return
+        options['rounds'] += 1
+
+        start = time.perf_counter()
+        cuts = 0
+
+        x_rel = np.array(model.cbGetNodeRel(model._xlist))
+        x_rel = x_rel.reshape(model._K, -1)
+        ei, ej = model._edges
+
+        for t in range(model._K):
+            for subset in fractional_subtours(
+                    model._n, ei, ej, x_rel[t], options['min_violation'],
+                    options['max_cuts']):
+                model.cbCut(subtour_expr(model, subset, t) <= len(subset)-1)
+                if model._cut_pool is not None:
+                    model._cut_pool.add(subset, t)
+                cuts += 1
 
+        if model._cb_stats is not None:
+            model._cb_stats['user_cuts'] += cuts
+            model._cb_stats['time'] += time.perf_counter() - start
@@ -0,0 +1,51 @@
+'''
+Nesse módulo consta a leitura de instâncias no formato TSPLIB com
+coordenadas (NODE_COORD_SECTION) e distâncias dos tipos EUC_2D, ATT ou GEO.
+'''
+
+SUPPORTED_TYPES = ('EUC_2D', 'ATT', 'GEO')
+
+def read_tsplib(path):
+    '''
+    Lê um arquivo TSPLIB.
+
+    Args:
+        path: caminho do arquivo '.tsp'.
+
+    Returns:
+        Dicionário com o nº de vértices 'n', as coordenadas 'points', a
+        métrica 'metric' (o EDGE_WEIGHT_TYPE) e o nome 'name', no formato
+        aceito por 'instance_io.save_instances'.
+    '''
+
+    header = {}
+    points = []
+    with open(path) as fp:
+        lines = iter(fp)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('NODE_COORD_SECTION'):
+                n = int(header['DIMENSION'])
+                while len(points) < n:
+                    fields = next(lines).split()
+                    if fields:
+                        points.append((float(fields[1]), float(fields[2])))
+                break
+            if line.startswith('EOF'):
+                break
+            if ':' in line:
+                key, value = line.split(':', 1)
+                header[key.strip()] = value.strip()
+
+    metric = header.get('EDGE_WEIGHT_TYPE')
+    if metric not in SUPPORTED_TYPES:
+        raise ValueError(f'EDGE_WEIGHT_TYPE não suportado: {metric}')
+    if not points:
+        raise ValueError('arquivo sem NODE_COORD_SECTION')
+
+    return {
+        'n': len(points), 'points': points, 'metric': metric,
+        'name': header.get('NAME', path),
+    }
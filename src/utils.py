@@ -1,72 +1,39 @@
 '''
 Funções auxiliares compartilhadas por alguns métodos.
 '''
-import gurobipy as gp
+import numpy as np
+from separation import solution_cycles
 
-def shortest_cycle(n, edges):
+def edge_arrays(n):
     '''
-    Função que constrói o menor ciclo de um conjunto de arestas, em termos
-    do número de vértices no ciclo.
+    Função que enumera as arestas (i,j), i > j, de um grafo completo na ordem
+    dos seus identificadores fixos, em que a aresta (i,j) tem identificador 
+    i*(i-1)/2 + j.
 
     Args:
         n: nº de vértices.
-        edges: lista de tuplas de arestas.
-        
+
     Returns:
-        Lista de vértices no menor ciclo, cada um conectado com o anterior
-        e próximo da lista.
+        Tupla de vetores com os vértices i e j de cada aresta.
     '''
 
-    unvisited = list(range(n))
-
-    # Tamanho inicial tem um nó a mais, p/ forçar atualização
-    cycle = range(n + 1) 
-
-    while unvisited:  # 'True' enquanto pilha for não-vazia
-        thiscycle = []
-        neighbors = unvisited
-
-        # Construir ciclo
-        while neighbors:
-            current = neighbors[0]
-            thiscycle.append(current)
-            unvisited.remove(current)
-            # 'select(current, '*')' retorna todos vizinhos de 'current'
-            neighbors = [
-                j 
-                for i, j in edges.select(current, '*')
-                if j in unvisited
-            ]
-
-        # Atualizar menor ciclo, se preciso
-        if len(cycle) > len(thiscycle):
-            cycle = thiscycle
+    return np.tril_indices(n, -1)
 
-    return cycle
-
-def get_edges_in_tour(tour_id, x_sol, all_edges):
+def edge_id(i, j):
     '''
-    Função que, dado o conjunto de variáveis na solução, retorna as arestas
-    (i, j) que estão presentes em uma rota.
+    Função que retorna o identificador fixo da aresta (i,j).
 
     Args:
-        tour_id: identificador da rota.
-        x_sol: valores de 'x' (variáveis que indicam presença das arestas) na 
-            solução.
-        all_edges: lista de arestas (i,j) no grafo de entrada.
+        i, j: vértices da aresta, em qualquer ordem.
 
     Returns:
-        Lista de arestas (i,j) na rota 'tour_id'.
+        Identificador da aresta.
     '''
 
-    return gp.tuplelist(
-        (i, j) 
-        for i, j, k in all_edges
-        if x_sol[i, j, k] > 0.5 and k == tour_id
-    )       
-
+    i, j = max(i, j), min(i, j)
+    return i * (i - 1) // 2 + j
 
-def build_tours_in_sol(K, n, x_sol, all_edges):
+def build_tours_in_sol(K, n, x_sol, edges):
     '''
     Função que constrói as rotas correspondentes aos valores das variáveis
     'x' na solução.
@@ -74,20 +41,20 @@ def build_tours_in_sol(K, n, x_sol, all_edges):
     Args:
         K: nº de caixeiros viajantes.
         n: nº de vértices do grafo.
-        x_sol: valores de 'x' (variáveis que indicam presença das arestas) na 
-            solução.
-        all_edges: lista de arestas (i,j) no grafo de entrada.
+        x_sol: vetor (K x nº de arestas) com os valores de 'x' (variáveis que
+            indicam presença das arestas) na solução.
+        edges: tupla de vetores com os vértices i e j de cada aresta, na ordem
+            dos identificadores fixos.
     
     Returns:
-        Lista de rotas na solução.
+        Lista de rotas na solução. Se uma rota possuir subciclos, é retornado
+        o menor deles.
     '''
 
-    tours = []
-    for t in range(K):
-        edges_in_tour = get_edges_in_tour(t, x_sol, all_edges) 
-        tours.append(shortest_cycle(n, edges_in_tour))
-
-    return tours
+    return [
+        min(cycles, key=len) 
+        for cycles in solution_cycles(K, n, x_sol, edges)
+    ]
 
 def print_solution(K, tours, cost):
     '''